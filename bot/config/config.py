@@ -11,6 +11,13 @@ class Settings(BaseSettings):
     FEED_AMOUNT: list = [10,20]
     MINE_AMOUNT: list = [10,20]
     SLEEP_TIME: list = [600,1200]
+    ADAPTIVE_WAKE: bool = True
+    WAKE_BOUNDS: list = [600, 3600]
+    WAKE_ENERGY_RATIO: float = 0.8
+    WAKE_JITTER: float = 0.1
+    CYCLE_REQUEST_BUDGET: int = 60
+    PLAN_PAUSE: list = [2,5]
+    PLAN_MAX_AMOUNT: int = 100
 
     AUTO_UPGRADE: bool = True
     SAVE_COIN: int = 400_000
@@ -21,6 +28,82 @@ class Settings(BaseSettings):
     REF_ID: str = ''
     USE_PROXY_FROM_FILE: bool = False
 
+    LOG_LEVEL: str = "DEBUG"
+    LOG_PLAIN: bool = False
+    LOG_FILE: str = ''
+    LOG_BATCH_INTERVAL: float = 0.2
+    LOG_SAMPLE_RATE: int = 1
+
+    API_BASE_URL: str = "https://ranch-api.kuroro.com/api"
+    DELAY_SCALE: float = 1.0
+
+    HTTP_POOL_LIMIT: int = 1000
+    HTTP_POOL_LIMIT_PER_HOST: int = 100
+    HTTP_DNS_CACHE_TTL: int = 300
+    HTTP_KEEPALIVE_TIMEOUT: int = 60
+    HTTP_TIMEOUT: int = 30
+
+    WEB_DATA_LIFETIME: int = 3600
+    WEB_DATA_REFRESH_MARGIN: int = 300
+
+    READ_CONCURRENCY: int = 4
+    STATE_RESYNC_INTERVAL: int = 3600
+    BAN_CHECK_INTERVAL: int = 3600
+
+    ONBOARDING_CONCURRENCY: int = 20
+
+    RETRY_ATTEMPTS: int = 3
+    RETRY_BASE_DELAY: float = 1.0
+    RETRY_MAX_DELAY: float = 30.0
+
+    BREAKER_WINDOW: int = 50
+    BREAKER_MIN_REQUESTS: int = 20
+    BREAKER_FAILURE_RATIO: float = 0.5
+    BREAKER_OPEN_TIME: int = 60
+    BREAKER_PROBES: int = 3
+    BREAKER_PER_ENDPOINT: bool = False
+
+    RATE_LIMIT_GLOBAL: float = 0
+    RATE_LIMIT_PER_PROXY: float = 5
+    RATE_LIMIT_PER_ENDPOINT: float = 0
+    RATE_LIMIT_ENDPOINTS: dict[str, float] = {}
+    RATE_LIMIT_BURST: int = 10
+
+    SAVE_BATCH_SIZE: int = 200
+    SAVE_FLUSH_INTERVAL: int = 30
+
+    SCHEDULER_WORKERS: int = 100
+    RAMP_UP_TIME: int = 120
+    SCHEDULER_REPORT_INTERVAL: int = 60
+    CHECKPOINT_FILE: str = 'sessions/checkpoints.sqlite3'
+    WORKER_RESTART_DELAY: int = 10
+    SHUTDOWN_TIMEOUT: int = 30
+
+    METRICS_FILE: str = ''
+    METRICS_HOST: str = '127.0.0.1'
+    METRICS_PORT: int = 0
+    METRICS_INTERVAL: int = 15
+
+    TG_MAX_OPEN_CLIENTS: int = 50
+    TG_IDLE_TIMEOUT: int = 300
+
+    PROXY_CHECK_URL: str = 'https://httpbin.org/ip'
+    PROXY_CHECK_TIMEOUT: int = 5
+    PROXY_CHECK_TTL: int = 600
+    PROXY_CHECK_CONCURRENCY: int = 50
+    PROXY_REPROBE_INTERVAL: int = 300
+    PROXY_MIN_LATENCY: float = 0.05
+
+    PROFILE_DIR: str = 'profiles'
+    PROFILE_WINDOW: int = 300
+    PROFILE_SAMPLE_INTERVAL: float = 0.005
+    PROFILE_SLOW_CALLBACK: float = 0.1
+    PROFILE_TRACEMALLOC: int = 0
+
+    CASSETTE_RECORD: str = ''
+    CASSETTE_REPLAY: str = ''
+    CASSETTE_TIME_SCALE: float = 1.0
+
 
 settings = Settings()
 
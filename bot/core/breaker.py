@@ -0,0 +1,131 @@
+from collections import deque
+from enum import Enum
+from time import monotonic
+
+from bot.config import settings
+from bot.utils import logger
+from bot.utils.metrics import registry
+
+
+class CircuitState(str, Enum):
+    CLOSED = 'closed'
+    HALF_OPEN = 'half_open'
+    OPEN = 'open'
+
+
+STATE_VALUES = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 1, CircuitState.OPEN: 2}
+
+CIRCUIT_STATE = registry.gauge('kuroro_circuit_state', 'Circuit state (0 closed, 1 half-open, 2 open)', ('circuit',),
+                               aggregate='max')
+CIRCUIT_TRANSITIONS = registry.counter('kuroro_circuit_transitions_total', 'Circuit state changes',
+                                       ('circuit', 'state'))
+CIRCUIT_REJECTED = registry.counter('kuroro_circuit_rejected_total', 'Requests rejected by an open circuit',
+                                    ('circuit',))
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CircuitState.CLOSED
+        self.outcomes = deque(maxlen=settings.BREAKER_WINDOW)
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        CIRCUIT_STATE.set(name, value=STATE_VALUES[self.state])
+
+    def _transition(self, state: CircuitState) -> None:
+        if state == self.state:
+            return
+
+        previous, self.state = self.state, state
+        if state == CircuitState.OPEN:
+            self.opened_at = monotonic()
+        if state != CircuitState.HALF_OPEN:
+            self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.outcomes.clear()
+
+        CIRCUIT_STATE.set(self.name, value=STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.inc(self.name, state.value)
+        if state == CircuitState.OPEN:
+            logger.warning(f"Circuit <cyan>{self.name}</cyan> | {previous.value} -> <red>open</red> "
+                           f"for {settings.BREAKER_OPEN_TIME}s")
+        else:
+            logger.info(f"Circuit <cyan>{self.name}</cyan> | {previous.value} -> {state.value}")
+
+    def remaining(self) -> float:
+        if self.state != CircuitState.OPEN:
+            return 0.0
+
+        return max(0.0, self.opened_at + settings.BREAKER_OPEN_TIME - monotonic())
+
+    def allow(self) -> bool:
+        if self.state == CircuitState.OPEN:
+            if self.remaining() > 0:
+                CIRCUIT_REJECTED.inc(self.name)
+                return False
+            self._transition(CircuitState.HALF_OPEN)
+
+        if self.state == CircuitState.HALF_OPEN:
+            if self.probes_in_flight >= settings.BREAKER_PROBES:
+                CIRCUIT_REJECTED.inc(self.name)
+                return False
+            self.probes_in_flight += 1
+
+        return True
+
+    def release(self) -> None:
+        if self.state == CircuitState.HALF_OPEN and self.probes_in_flight > 0:
+            self.probes_in_flight -= 1
+
+    def record(self, success: bool) -> None:
+        if self.state == CircuitState.HALF_OPEN:
+            self.release()
+            if not success:
+                self._transition(CircuitState.OPEN)
+            else:
+                self.probe_successes += 1
+                if self.probe_successes >= settings.BREAKER_PROBES:
+                    self._transition(CircuitState.CLOSED)
+            return
+
+        if self.state == CircuitState.OPEN:
+            return
+
+        self.outcomes.append(success)
+        failures = self.outcomes.count(False)
+        if (len(self.outcomes) >= settings.BREAKER_MIN_REQUESTS
+                and failures / len(self.outcomes) >= settings.BREAKER_FAILURE_RATIO):
+            self._transition(CircuitState.OPEN)
+
+
+class BreakerRegistry:
+    def __init__(self):
+        self.breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            breaker = self.breakers[name] = CircuitBreaker(name)
+
+        return breaker
+
+    def acquire(self, host: str, endpoint: str) -> list[CircuitBreaker] | None:
+        names = [host, f"{host}{endpoint}"] if settings.BREAKER_PER_ENDPOINT else [host]
+        granted = []
+        for name in names:
+            breaker = self.get(name)
+            if not breaker.allow():
+                for acquired in granted:
+                    acquired.release()
+                return None
+            granted.append(breaker)
+
+        return granted
+
+    def open_for(self, host: str) -> float:
+        breaker = self.breakers.get(host)
+        return breaker.remaining() if breaker else 0.0
+
+
+breakers = BreakerRegistry()
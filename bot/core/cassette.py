@@ -0,0 +1,160 @@
+import asyncio
+import gzip
+import json
+import os
+import random
+from collections import deque
+from time import monotonic, time
+from urllib.parse import parse_qs, urlencode
+
+from bot.config import settings
+from bot.utils import logger
+from .retry import ApiResult, ErrorClass
+from .web_data import parse_web_data
+
+
+VERSION = 1
+
+
+def redact_web_data(init_data: str) -> str:
+    # Only the auth date and user id are read back on replay, the hash and the profile would let anyone log in as
+    # the account or tell who it is
+    auth_date, user_id = parse_web_data(init_data)
+    query = {'auth_date': auth_date, 'user': json.dumps({'id': user_id}), 'hash': 'redacted'}
+    if 'query_id' in parse_qs(init_data):
+        query['query_id'] = 'redacted'
+    return urlencode(query)
+
+
+class Cassette:
+    def __init__(self):
+        self.mode: str | None = None
+        self.path = ''
+        self.seed = 0
+        self.time_scale = 1.0
+
+        self._started = monotonic()
+        self._entries: list[dict] = []
+        # (session, method, endpoint) -> recorded results, served in the order they were captured
+        self._responses: dict[tuple[str, str, str], deque[dict]] = {}
+        self._web_data: dict[str, deque[str]] = {}
+        self._rngs: dict[str, random.Random] = {}
+
+        self.served = 0
+        self.misses = 0
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == 'record'
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    def configure(self) -> None:
+        if settings.CASSETTE_REPLAY:
+            self.replay(settings.CASSETTE_REPLAY, time_scale=settings.CASSETTE_TIME_SCALE)
+        elif settings.CASSETTE_RECORD:
+            self.record(settings.CASSETTE_RECORD)
+
+    def record(self, path: str, seed: int | None = None) -> None:
+        self.mode, self.path = 'record', path
+        self.seed = int(time()) if seed is None else seed
+        self._started = monotonic()
+        self._entries = []
+        self._rngs = {}
+        logger.info(f"Recording traffic to <cyan>{path}</cyan>")
+
+    def replay(self, path: str, time_scale: float = 1.0) -> None:
+        self.mode, self.path = 'replay', path
+        self.time_scale = time_scale
+        self._responses, self._web_data = {}, {}
+        self.served = self.misses = 0
+
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            header = json.loads(file.readline())
+            if header.get('version') != VERSION:
+                raise ValueError(f"Unsupported cassette version {header.get('version')} in {path}")
+
+            self.seed = header['seed']
+            for line in file:
+                entry = json.loads(line)
+                if entry['k'] == 'web_data':
+                    self._web_data.setdefault(entry['s'], deque()).append(entry['v'])
+                else:
+                    self._responses.setdefault((entry['s'], entry['m'], entry['e']), deque()).append(entry)
+
+        self._rngs = {}
+        logger.info(f"Replaying <cyan>{sum(map(len, self._responses.values()))}</cyan> responses "
+                    f"for <cyan>{len(self.sessions())}</cyan> sessions from <cyan>{path}</cyan>")
+
+    def rng(self, session: str):
+        if self.mode is None:
+            return random
+
+        # The cycle makes its choices with this, so replaying with the same seed walks the same branches. One per
+        # session keeps the draws independent of how concurrent cycles interleave
+        rng = self._rngs.get(session)
+        if rng is None:
+            rng = self._rngs[session] = random.Random(f"{self.seed}:{session}")
+        return rng
+
+    def sessions(self) -> list[str]:
+        return sorted({session for session, _, _ in self._responses} | set(self._web_data))
+
+    def record_response(self, session: str, method: str, endpoint: str, result: ApiResult, elapsed: float) -> None:
+        entry = {'k': 'http', 's': session, 'm': method, 'e': endpoint, 't': round(elapsed, 4),
+                 'at': round(monotonic() - self._started, 4), 'st': result.status}
+        if result.ok:
+            entry['v'] = result.value
+        else:
+            entry['ec'] = result.error_class.value
+            entry['er'] = result.error
+            if result.retry_after is not None:
+                entry['ra'] = result.retry_after
+        self._entries.append(entry)
+
+    def record_web_data(self, session: str, init_data: str | None) -> None:
+        if init_data:
+            self._entries.append({'k': 'web_data', 's': session, 'v': redact_web_data(init_data),
+                                  'at': round(monotonic() - self._started, 4)})
+
+    async def replay_response(self, session: str, method: str, endpoint: str) -> ApiResult:
+        track = self._responses.get((session, method, endpoint))
+        if not track:
+            self.misses += 1
+            return ApiResult(status=404, error="Not in cassette", error_class=ErrorClass.CLIENT)
+
+        entry = track.popleft()
+        self.served += 1
+        if self.time_scale > 0 and entry['t'] > 0:
+            await asyncio.sleep(entry['t'] * self.time_scale)
+
+        if 'ec' in entry:
+            return ApiResult(status=entry['st'], error=entry['er'], error_class=ErrorClass(entry['ec']),
+                             retry_after=entry.get('ra'))
+
+        return ApiResult(value=entry['v'], status=entry['st'])
+
+    def replay_web_data(self, session: str) -> str | None:
+        track = self._web_data.get(session)
+        if not track:
+            return None
+
+        # Keep serving the last capture, the cache asks again whenever it thinks the data went stale
+        return track.popleft() if len(track) > 1 else track[0]
+
+    def save(self) -> None:
+        if not self.recording or not self._entries:
+            return
+
+        tmp_path = f"{self.path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as file:
+            file.write(json.dumps({'version': VERSION, 'seed': self.seed}) + '\n')
+            for entry in self._entries:
+                file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, self.path)
+        logger.info(f"Saved <cyan>{len(self._entries)}</cyan> exchanges to <cyan>{self.path}</cyan>")
+
+
+cassette = Cassette()
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import sqlite3
+
+from bot.config import settings
+from bot.utils import logger
+from .clock import clock
+
+
+FIELDS = ('last_cycle_at', 'next_due_at', 'claimed_on', 'onboarded', 'ban_checked_at', 'reincarnated_at', 'proxy')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    session TEXT PRIMARY KEY,
+    last_cycle_at REAL NOT NULL DEFAULT 0,
+    next_due_at REAL NOT NULL DEFAULT 0,
+    claimed_on TEXT NOT NULL DEFAULT '',
+    onboarded INTEGER NOT NULL DEFAULT 0,
+    ban_checked_at REAL NOT NULL DEFAULT 0,
+    reincarnated_at REAL NOT NULL DEFAULT 0,
+    proxy TEXT NOT NULL DEFAULT ''
+)
+"""
+
+# Columns added after the first release, created on databases that predate them
+MIGRATIONS = {'proxy': "ALTER TABLE checkpoints ADD COLUMN proxy TEXT NOT NULL DEFAULT ''"}
+
+
+def today() -> str:
+    return clock.now().date().isoformat()
+
+
+class Checkpoint:
+    # Wall clock times, so they stay meaningful across restarts
+    __slots__ = FIELDS
+
+    def __init__(self, last_cycle_at: float = 0, next_due_at: float = 0, claimed_on: str = '',
+                 onboarded: bool = False, ban_checked_at: float = 0, reincarnated_at: float = 0, proxy: str = ''):
+        self.last_cycle_at = last_cycle_at
+        self.next_due_at = next_due_at
+        self.claimed_on = claimed_on
+        self.onboarded = bool(onboarded)
+        self.ban_checked_at = ban_checked_at
+        self.reincarnated_at = reincarnated_at
+        self.proxy = proxy
+
+    @property
+    def claimed_today(self) -> bool:
+        return self.claimed_on == today()
+
+    def ban_check_due(self) -> bool:
+        return clock.time() - self.ban_checked_at >= settings.BAN_CHECK_INTERVAL
+
+    def remaining(self) -> float:
+        return self.next_due_at - clock.time()
+
+
+class CheckpointStore:
+    def __init__(self, file_name: str | None = None):
+        self.file_name = settings.CHECKPOINT_FILE if file_name is None else file_name
+        self._db: sqlite3.Connection | None = None
+        self._checkpoints: dict[str, Checkpoint] | None = None
+        self._dirty: set[str] = set()
+        self._flush_handle: asyncio.Handle | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.file_name)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.file_name)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            # WAL lets the worker processes write their own sessions without blocking each other's reads
+            self._db = sqlite3.connect(self.file_name, timeout=10, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(SCHEMA)
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(checkpoints)")}
+            for column, statement in MIGRATIONS.items():
+                if column not in columns:
+                    self._db.execute(statement)
+
+        return self._db
+
+    def _load(self) -> dict[str, Checkpoint]:
+        if self._checkpoints is None:
+            self._checkpoints = {}
+            if self.enabled:
+                try:
+                    rows = self._connect().execute(f"SELECT session, {', '.join(FIELDS)} FROM checkpoints")
+                    self._checkpoints = {row[0]: Checkpoint(*row[1:]) for row in rows}
+                except sqlite3.Error as error:
+                    logger.warning(f"Checkpoints | Can't read <cyan>{self.file_name}</cyan>: {error}")
+
+        return self._checkpoints
+
+    def get(self, session_name: str) -> Checkpoint:
+        checkpoints = self._load()
+        checkpoint = checkpoints.get(session_name)
+        if checkpoint is None:
+            checkpoint = checkpoints[session_name] = Checkpoint()
+
+        return checkpoint
+
+    def update(self, session_name: str, **fields) -> Checkpoint:
+        checkpoint = self.get(session_name)
+        for name, value in fields.items():
+            setattr(checkpoint, name, value)
+
+        if self.enabled:
+            self._dirty.add(session_name)
+            self._schedule_flush()
+        return checkpoint
+
+    def record_cycle(self, session_name: str, sleep_time: float) -> Checkpoint:
+        now = clock.time()
+        return self.update(session_name, last_cycle_at=now, next_due_at=now + sleep_time)
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is not None:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+
+        # Cycles finish in bursts, so collect them into one transaction
+        self._flush_handle = loop.call_later(1, self.flush)
+
+    def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if not self._dirty:
+            return
+
+        rows = [(name, *(getattr(self._checkpoints[name], field) for field in FIELDS)) for name in self._dirty]
+        columns = ', '.join(FIELDS)
+        updates = ', '.join(f"{field} = excluded.{field}" for field in FIELDS)
+        try:
+            db = self._connect()
+            with db:
+                db.execute("BEGIN")
+                db.executemany(f"INSERT INTO checkpoints (session, {columns}) VALUES (?{', ?' * len(FIELDS)}) "
+                               f"ON CONFLICT(session) DO UPDATE SET {updates}", rows)
+        except sqlite3.Error as error:
+            logger.warning(f"Checkpoints | Can't write <cyan>{len(rows)}</cyan> session(s): {error}")
+            return
+
+        self._dirty.clear()
+
+    def close(self) -> None:
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+checkpoint_store = CheckpointStore()
@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+from time import time as wall_time
+
+
+class GameClock:
+    # Wall time, unless the mock bench skips ahead to simulate hours of sleeping in seconds
+    def __init__(self):
+        self.offset = 0.0
+
+    def time(self) -> float:
+        return wall_time() + self.offset
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.time(), timezone.utc)
+
+    def advance(self, seconds: float) -> None:
+        self.offset += seconds
+
+
+clock = GameClock()
@@ -0,0 +1,39 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+if orjson is not None:
+    BACKEND = 'orjson'
+    loads = orjson.loads
+
+    def dumps(value) -> str:
+        return orjson.dumps(value).decode()
+
+elif msgspec is not None:
+    BACKEND = 'msgspec'
+    _decoder = msgspec.json.Decoder()
+    _encoder = msgspec.json.Encoder()
+    loads = _decoder.decode
+
+    def dumps(value) -> str:
+        return _encoder.encode(value).decode()
+
+else:
+    BACKEND = 'json'
+    loads = json.loads
+
+    def dumps(value) -> str:
+        return json.dumps(value, separators=(',', ':'))
+
+
+# json and orjson raise ValueError subclasses, msgspec has its own error type
+DECODE_ERRORS = (ValueError, msgspec.DecodeError) if msgspec is not None else (ValueError,)
@@ -0,0 +1,121 @@
+import aiohttp
+from aiocfscrape import CloudflareScraper
+from aiohttp_proxy import ProxyConnector
+
+from bot.config import settings
+from bot.utils import logger
+
+
+class ConnectionManager:
+    def __init__(self):
+        self._connectors: dict[str | None, aiohttp.TCPConnector] = {}
+        # Open clients per connector, the connector is closed when the last one is released
+        self._users: dict[str | None, int] = {}
+
+        self.pool_hits = 0
+        self.pool_misses = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+        self._trace_config = aiohttp.TraceConfig()
+        self._trace_config.on_connection_create_end.append(self._on_connection_create)
+        self._trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+        self._trace_config.on_dns_cache_hit.append(self._on_dns_cache_hit)
+        self._trace_config.on_dns_cache_miss.append(self._on_dns_cache_miss)
+
+    async def _on_connection_create(self, session, ctx, params):
+        self.connections_created += 1
+
+    async def _on_connection_reuse(self, session, ctx, params):
+        self.connections_reused += 1
+
+    async def _on_dns_cache_hit(self, session, ctx, params):
+        self.dns_cache_hits += 1
+
+    async def _on_dns_cache_miss(self, session, ctx, params):
+        self.dns_cache_misses += 1
+
+    def _create_connector(self, proxy: str | None) -> aiohttp.TCPConnector:
+        options = dict(
+            limit=settings.HTTP_POOL_LIMIT,
+            limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+        )
+        if proxy:
+            return ProxyConnector.from_url(proxy, **options)
+
+        return aiohttp.TCPConnector(**options)
+
+    def get_connector(self, proxy: str | None) -> aiohttp.TCPConnector:
+        connector = self._connectors.get(proxy)
+        if connector is None or connector.closed:
+            self.pool_misses += 1
+            connector = self._connectors[proxy] = self._create_connector(proxy)
+        else:
+            self.pool_hits += 1
+
+        return connector
+
+    def get_client(self, proxy: str | None, headers: dict) -> CloudflareScraper:
+        self._users[proxy] = self._users.get(proxy, 0) + 1
+        return CloudflareScraper(headers=headers,
+                                 connector=self.get_connector(proxy),
+                                 connector_owner=False,
+                                 timeout=aiohttp.ClientTimeout(total=settings.HTTP_TIMEOUT),
+                                 trace_configs=[self._trace_config])
+
+    async def release(self, proxy: str | None, http_client: CloudflareScraper | None = None) -> None:
+        if http_client is not None and not http_client.closed:
+            await http_client.close()
+
+        users = self._users.get(proxy, 0) - 1
+        if users > 0:
+            self._users[proxy] = users
+            return
+
+        self._users.pop(proxy, None)
+        connector = self._connectors.pop(proxy, None)
+        if connector is not None and not connector.closed:
+            await connector.close()
+
+    def stats(self) -> dict:
+        open_sockets = 0
+        idle_sockets = 0
+        for connector in self._connectors.values():
+            open_sockets += len(getattr(connector, '_acquired', ()))
+            idle_sockets += sum(len(conns) for conns in getattr(connector, '_conns', {}).values())
+
+        return {
+            'pools': len(self._connectors),
+            'clients': sum(self._users.values()),
+            'pool_hits': self.pool_hits,
+            'pool_misses': self.pool_misses,
+            'connections_created': self.connections_created,
+            'connections_reused': self.connections_reused,
+            'dns_cache_hits': self.dns_cache_hits,
+            'dns_cache_misses': self.dns_cache_misses,
+            'open_sockets': open_sockets,
+            'idle_sockets': idle_sockets,
+        }
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        logger.info(f"HTTP pool | Pools: <cyan>{stats['pools']}</cyan> "
+                    f"(hits <cyan>{stats['pool_hits']}</cyan> / misses <cyan>{stats['pool_misses']}</cyan>) - "
+                    f"Connections: new <cyan>{stats['connections_created']}</cyan> / "
+                    f"reused <cyan>{stats['connections_reused']}</cyan> - "
+                    f"Sockets: open <cyan>{stats['open_sockets']}</cyan> / idle <cyan>{stats['idle_sockets']}</cyan>")
+
+    async def close(self) -> None:
+        for connector in self._connectors.values():
+            if not connector.closed:
+                await connector.close()
+
+        self._connectors.clear()
+        self._users.clear()
+
+
+connection_manager = ConnectionManager()
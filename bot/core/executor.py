@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class ReadPhase:
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(max(1, limit))
+        self._nodes: dict[str, tuple[Callable[..., Awaitable], tuple[str, ...]]] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable], *deps: str) -> None:
+        if name in self._nodes:
+            raise ValueError(f"Duplicate read node '{name}'")
+
+        self._nodes[name] = (func, deps)
+
+    def _check_graph(self) -> None:
+        visiting, done = set(), set()
+
+        def visit(name, path):
+            if name in done:
+                return
+            if name not in self._nodes:
+                raise ValueError(f"Unknown dependency '{name}' in {' -> '.join(path)}")
+            if name in visiting:
+                raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+
+            visiting.add(name)
+            for dep in self._nodes[name][1]:
+                visit(dep, path + [name])
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self._nodes:
+            visit(name, [])
+
+    async def run(self) -> dict[str, Any]:
+        self._check_graph()
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def execute(name):
+            func, deps = self._nodes[name]
+            # Dependencies are awaited outside of the semaphore so they never starve each other
+            dep_results = {dep: await tasks[dep] for dep in deps}
+            async with self.semaphore:
+                return await func(**dep_results)
+
+        for name in self._nodes:
+            tasks[name] = asyncio.ensure_future(execute(name))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        return {name: task.result() for name, task in tasks.items()}
@@ -0,0 +1,146 @@
+from abc import ABC, abstractmethod
+
+
+NUMBER = (int, float)
+MISSING = object()
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def field(data: dict, key: str, kind, default=MISSING):
+    value = data.get(key, MISSING)
+    if value is MISSING or value is None:
+        if default is MISSING:
+            raise DecodeError(f"missing field {key!r}")
+        return default
+
+    if not isinstance(value, kind):
+        raise DecodeError(f"field {key!r} has type {type(value).__name__}")
+
+    return value
+
+
+def nested(data: dict, key: str, inner: str, kind):
+    value = field(data, key, dict, None)
+    return None if value is None else field(value, inner, kind, None)
+
+
+class Model(ABC):
+    __slots__ = ()
+
+    @classmethod
+    @abstractmethod
+    def from_dict(cls, data: dict):
+        ...
+
+    @classmethod
+    def decode(cls, data):
+        if not isinstance(data, dict):
+            raise DecodeError(f"{cls.__name__} expects an object, got {type(data).__name__}")
+
+        return cls.from_dict(data)
+
+    @classmethod
+    def decode_list(cls, data) -> list:
+        if not isinstance(data, list):
+            raise DecodeError(f"{cls.__name__} list expects an array, got {type(data).__name__}")
+
+        return [cls.decode(item) for item in data]
+
+    def __repr__(self) -> str:
+        values = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+
+class PlayerSnapshot(Model):
+    # Write endpoints answer with the same shape, so every field may be missing
+    __slots__ = ('coins', 'energy', 'max_energy', 'shards', 'beast_level')
+
+    def __init__(self, coins=None, energy=None, max_energy=None, shards=None, beast_level=None):
+        self.coins = coins
+        self.energy = energy
+        self.max_energy = max_energy
+        self.shards = shards
+        self.beast_level = beast_level
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(coins=nested(data, 'coinsSnapshot', 'value', NUMBER),
+                   energy=nested(data, 'energySnapshot', 'value', NUMBER),
+                   max_energy=nested(data, 'energySnapshot', 'maxValue', NUMBER),
+                   shards=field(data, 'shards', NUMBER, None),
+                   beast_level=nested(data, 'beast', 'level', int))
+
+
+class BallState(Model):
+    __slots__ = ('current_health', 'is_destroyed')
+
+    def __init__(self, current_health: int, is_destroyed: bool):
+        self.current_health = current_health
+        self.is_destroyed = is_destroyed
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(current_health=field(data, 'currentHealth', int, 0),
+                   is_destroyed=field(data, 'isDestroyed', bool, True))
+
+
+class DailyStreakState(Model):
+    __slots__ = ('is_today_claimed',)
+
+    def __init__(self, is_today_claimed: bool):
+        self.is_today_claimed = is_today_claimed
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(is_today_claimed=field(data, 'isTodayClaimed', bool, False))
+
+
+class Listing(Model):
+    __slots__ = ('item_id', 'name', 'coin_cost', 'in_stock')
+
+    def __init__(self, item_id: str, name: str, coin_cost: int, in_stock: bool):
+        self.item_id = item_id
+        self.name = name
+        self.coin_cost = coin_cost
+        self.in_stock = in_stock
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(item_id=field(data, 'itemId', str),
+                   name=field(data, 'name', str, ''),
+                   coin_cost=field(data, 'coinCost', NUMBER),
+                   in_stock=field(data, 'inStock', bool, False))
+
+
+class InventoryItem(Model):
+    __slots__ = ('item_id', 'quantity')
+
+    def __init__(self, item_id: str, quantity: int):
+        self.item_id = item_id
+        self.quantity = quantity
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(item_id=field(data, 'itemId', str), quantity=field(data, 'quantity', int, 0))
+
+
+class Upgrade(Model):
+    __slots__ = ('upgrade_id', 'name', 'cost', 'earn_increment', 'can_be_purchased')
+
+    def __init__(self, upgrade_id: str, name: str, cost: int, earn_increment: int, can_be_purchased: bool):
+        self.upgrade_id = upgrade_id
+        self.name = name
+        self.cost = cost
+        self.earn_increment = earn_increment
+        self.can_be_purchased = can_be_purchased
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(upgrade_id=field(data, 'upgradeId', str),
+                   name=field(data, 'name', str, ''),
+                   cost=field(data, 'cost', NUMBER),
+                   earn_increment=field(data, 'earnIncrement', NUMBER, 0),
+                   can_be_purchased=field(data, 'canBePurchased', bool, False))
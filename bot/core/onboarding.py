@@ -0,0 +1,55 @@
+import asyncio
+from time import monotonic
+
+from bot.config import settings
+from bot.utils import logger
+
+
+STARTER = "Digby"
+COMPLETED = "Completed"
+
+STEPS = ("WelcomeMessage", "PreStarterSelection", "StarterSelection", "TappingEgg", "BeastHatched", "HelloBeast",
+         "FeedBeast", "MoodXpExplanation", "PreMineShards", "MineShards", "FeedBeastAgain", "FeedBeastMore",
+         "BeastLevelUp", "CoinSpendingUpgrades", "CoinEarningAway", "MoreLevelMoreCoins", "BeastHappinessAway",
+         "BeastHappinessAway2", "ThatsAll")
+
+# Step reported by GetOnboardingState -> (requests that finish it, step the server is at afterwards)
+TRANSITIONS: dict[str, tuple[list[tuple[str, dict]], str]] = {
+    step: ([("/Onboarding/UpdateStep", {"newStep": next_step})], next_step)
+    for step, next_step in zip(STEPS, STEPS[1:])
+}
+TRANSITIONS["StarterSelection"][0].insert(0, ("/Onboarding/SelectStarter", {"starterOption": STARTER}))
+TRANSITIONS["ThatsAll"] = ([("/Onboarding/CompleteOnboarding", {})], COMPLETED)
+
+
+def needs_onboarding(step: str | None) -> bool:
+    return step in TRANSITIONS
+
+
+def remaining_steps(step: str) -> int:
+    return len(STEPS) - STEPS.index(step) if step in TRANSITIONS else 0
+
+
+async def onboard_all(tappers: list, limit: int | None = None) -> dict[str, bool]:
+    semaphore = asyncio.Semaphore(max(1, limit or settings.ONBOARDING_CONCURRENCY))
+    started = monotonic()
+
+    async def run(tapper, proxy: str | None) -> bool:
+        async with semaphore:
+            await tapper.start(proxy=proxy)
+            try:
+                return await tapper.onboard()
+            except Exception as error:
+                tapper.error(f"Onboarding failed: {error}")
+                return False
+            finally:
+                await tapper.close()
+
+    results = await asyncio.gather(*(run(tapper, proxy) for tapper, proxy in tappers))
+    done = dict(zip((tapper.session_name for tapper, _ in tappers), results))
+
+    logger.info(f"Onboarding | Accounts: <cyan>{len(done)}</cyan> - "
+                f"Ready: <cyan>{sum(done.values())}</cyan> - "
+                f"Failed: <cyan>{len(done) - sum(done.values())}</cyan> - "
+                f"Took: <cyan>{monotonic() - started:.1f}s</cyan>")
+    return done
@@ -0,0 +1,74 @@
+import json
+import os
+
+from pyrogram.errors import (PeerIdInvalid, UserIdInvalid, BotInvalid, UsernameInvalid, UsernameNotOccupied,
+                             InputUserDeactivated)
+from pyrogram.raw.types import InputPeerUser
+
+from bot.utils import logger
+
+
+# Errors that mean the cached bot peer is no longer valid and has to be resolved again
+PEER_ERRORS = (PeerIdInvalid, UserIdInvalid, BotInvalid, UsernameInvalid, UsernameNotOccupied, InputUserDeactivated)
+
+
+class PeerCache:
+    def __init__(self, workdir: str = "sessions/"):
+        self.workdir = workdir
+        self._entries: dict[str, dict | None] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, session_name: str) -> str:
+        return os.path.join(self.workdir, f"{session_name}.peer.json")
+
+    def get(self, session_name: str) -> dict | None:
+        if session_name not in self._entries:
+            try:
+                with open(self._path(session_name), 'r') as file:
+                    entry = json.load(file)
+            except FileNotFoundError:
+                entry = None
+            except (json.JSONDecodeError, OSError):
+                logger.warning(f"{session_name} | Peer cache is corrupted, resolving again")
+                entry = None
+
+            if entry is not None and not (entry.get('bot') and entry.get('me')):
+                entry = None
+            self._entries[session_name] = entry
+
+        entry = self._entries[session_name]
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def bot_peer(self, entry: dict) -> InputPeerUser:
+        return InputPeerUser(user_id=entry['bot']['user_id'], access_hash=entry['bot']['access_hash'])
+
+    def store(self, session_name: str, bot_peer: InputPeerUser, me) -> dict:
+        entry = {
+            'bot': {'user_id': bot_peer.user_id, 'access_hash': bot_peer.access_hash},
+            'me': {'id': me.id, 'first_name': me.first_name, 'last_name': me.last_name, 'username': me.username},
+        }
+        self._entries[session_name] = entry
+
+        path = self._path(session_name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(entry, file)
+        os.replace(tmp_path, path)
+
+        return entry
+
+    def invalidate(self, session_name: str) -> None:
+        self._entries[session_name] = None
+        try:
+            os.remove(self._path(session_name))
+        except FileNotFoundError:
+            pass
+
+
+peer_cache = PeerCache()
@@ -0,0 +1,83 @@
+import random
+from collections import Counter
+from math import ceil
+
+from bot.config import settings
+
+
+class CyclePlanner:
+    def __init__(self, budget: int | None = None, rng: random.Random | None = None):
+        self.budget = settings.CYCLE_REQUEST_BUDGET if budget is None else budget
+        self.rng = rng or random
+        self.requests = Counter()
+        self.spent = Counter()
+
+    @property
+    def used(self) -> int:
+        return sum(self.requests.values())
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.budget - self.used)
+
+    def _split(self, total: int, amount_range, requests: int) -> list[int]:
+        if total <= 0 or requests <= 0:
+            return []
+
+        # Chunks are drawn from the configured range, but grow (up to PLAN_MAX_AMOUNT) when that
+        # range would need more requests than this step is allowed
+        low, high = amount_range
+        floor = min(ceil(total / requests), settings.PLAN_MAX_AMOUNT)
+        chunks = []
+        while total > 0 and len(chunks) < requests:
+            chunk = min(total, max(self.rng.randint(low, high), floor))
+            chunks.append(chunk)
+            total -= chunk
+
+        return chunks
+
+    def hits(self, health: int, destroyed: bool) -> list[int]:
+        if destroyed:
+            return []
+
+        # The ball takes a few hits beyond its health, the server clamps them
+        health += 3
+        chunks = []
+        for _ in range(min(self.rng.randint(2, 10), self.remaining)):
+            if health <= 0:
+                break
+            hits = min(self.rng.randint(1, 4), health)
+            chunks.append(hits)
+            health -= hits
+
+        return chunks
+
+    def mining(self, energy: int, amount_range=None, spend_all: bool = False) -> list[int]:
+        energy = max(0, energy)
+        # With adaptive wake-ups the session slept until this energy was there, so at least half of it is spent
+        low = energy // 2 if settings.ADAPTIVE_WAKE else 0
+        target = energy if spend_all else self.rng.randint(low, energy)
+        # Leave half of what is left for feeding and a possible energy drink
+        requests = self.remaining if spend_all else ceil(self.remaining / 2)
+        return self._split(target, amount_range or settings.MINE_AMOUNT, requests)
+
+    def feeding(self, shards: int) -> list[int]:
+        return self._split(self.rng.randint(0, max(0, shards)), settings.FEED_AMOUNT, ceil(self.remaining / 2))
+
+    def pause(self) -> int:
+        return self.rng.randint(*settings.PLAN_PAUSE)
+
+    def record(self, kind: str, amount: int, ok: bool) -> None:
+        self.requests[kind] += 1
+        if ok:
+            self.spent[kind] += amount
+
+    def summary(self) -> str:
+        parts = [f"Requests: <cyan>{self.used}</cyan>/<cyan>{self.budget}</cyan>"]
+        for kind in self.requests:
+            spent = self.spent[kind]
+            per_unit = self.requests[kind] / spent if spent else 0
+            parts.append(f"{kind.title()}: <cyan>{spent}</cyan> in <cyan>{self.requests[kind]}</cyan> "
+                         f"(<cyan>{per_unit:.3f}</cyan> req/unit)")
+
+        return "Plan | " + " - ".join(parts)
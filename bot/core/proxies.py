@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import os
+from time import monotonic, time
+
+import aiohttp
+from better_proxy import Proxy
+
+from bot.config import settings
+from bot.utils import logger
+from bot.utils.metrics import registry
+from .connection import connection_manager
+from .headers import headers
+
+
+PROXY_UP = registry.gauge('kuroro_proxy_up', 'Whether the last probe through the proxy succeeded', ('proxy',),
+                          aggregate='min')
+PROXY_LATENCY = registry.gauge('kuroro_proxy_latency_seconds', 'Latency of the last successful probe', ('proxy',),
+                               aggregate='max')
+
+
+def proxy_label(proxy: str | None) -> str:
+    if not proxy:
+        return 'direct'
+
+    proxy = Proxy.from_str(proxy)
+    return f"{proxy.host}:{proxy.port}"
+
+
+class ProxyHealth:
+    __slots__ = ('ok', 'latency', 'ip', 'error', 'checked_at', 'failures')
+
+    def __init__(self, ok: bool, latency: float = 0.0, ip: str | None = None, error: str | None = None,
+                 checked_at: float | None = None, failures: int = 0):
+        self.ok = ok
+        self.latency = latency
+        self.ip = ip
+        self.error = error
+        self.checked_at = time() if checked_at is None else checked_at
+        self.failures = failures
+
+    def expired(self) -> bool:
+        return time() - self.checked_at >= settings.PROXY_CHECK_TTL
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ProxyPool:
+    def __init__(self, file_name: str = "bot/config/proxies.txt"):
+        self.file_name = file_name
+        self.health: dict[str, ProxyHealth] = {}
+        self._proxies: list[str] | None = None
+        self._mtime = None
+        self._probes: dict[str, asyncio.Task] = {}
+
+    @property
+    def proxies(self) -> list[str]:
+        if not settings.USE_PROXY_FROM_FILE:
+            return []
+
+        mtime = os.path.getmtime(self.file_name)
+        if self._proxies is None or mtime != self._mtime:
+            with open(file=self.file_name, encoding="utf-8-sig") as file:
+                proxies = [Proxy.from_str(proxy=row.strip()).as_url for row in file if row.strip()]
+            # Keep the file order but drop duplicates, every proxy is probed and weighted once
+            self._proxies, self._mtime = list(dict.fromkeys(proxies)), mtime
+
+        return self._proxies
+
+    async def _probe(self, proxy: str) -> ProxyHealth:
+        previous = self.health.get(proxy)
+        started = monotonic()
+        try:
+            http_client = connection_manager.get_client(proxy=proxy, headers=headers)
+            try:
+                async with http_client.get(settings.PROXY_CHECK_URL, ssl=False,
+                                           timeout=aiohttp.ClientTimeout(total=settings.PROXY_CHECK_TIMEOUT)) as response:
+                    response.raise_for_status()
+                    data = await response.json(content_type=None)
+            finally:
+                await connection_manager.release(proxy, http_client)
+            health = ProxyHealth(ok=True, latency=monotonic() - started,
+                                 ip=data.get('origin') if isinstance(data, dict) else None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+            health = ProxyHealth(ok=False, error=str(error) or type(error).__name__,
+                                 failures=(previous.failures if previous else 0) + 1)
+
+        label = proxy_label(proxy)
+        PROXY_UP.set(label, value=int(health.ok))
+        if health.ok:
+            PROXY_LATENCY.set(label, value=health.latency)
+            if previous is not None and not previous.ok:
+                logger.success(f"Proxy {label} | Back up, latency <cyan>{health.latency:.2f}s</cyan>")
+        elif previous is None or previous.ok:
+            logger.warning(f"Proxy {label} | Probe failed: {health.error}")
+
+        self.health[proxy] = health
+        return health
+
+    async def check(self, proxy: str, force: bool = False) -> ProxyHealth:
+        health = self.health.get(proxy)
+        if health is not None and not force and not health.expired():
+            return health
+
+        # Sessions sharing a proxy wait for the same probe instead of sending their own
+        task = self._probes.get(proxy)
+        if task is None:
+            task = self._probes[proxy] = asyncio.create_task(self._probe(proxy))
+            task.add_done_callback(lambda _: self._probes.pop(proxy, None))
+
+        return await asyncio.shield(task)
+
+    async def check_all(self, proxies: list[str] | None = None, force: bool = False) -> dict[str, ProxyHealth]:
+        proxies = self.proxies if proxies is None else proxies
+        semaphore = asyncio.Semaphore(max(1, settings.PROXY_CHECK_CONCURRENCY))
+
+        async def check(proxy: str) -> ProxyHealth:
+            async with semaphore:
+                return await self.check(proxy, force=force)
+
+        results = await asyncio.gather(*(check(proxy) for proxy in proxies))
+        latencies = sorted(health.latency for health in results if health.ok)
+        if proxies:
+            message = f"Proxies | Healthy: <cyan>{len(latencies)}</cyan>/<cyan>{len(proxies)}</cyan>"
+            if latencies:
+                message += f" - Median latency: <cyan>{latencies[len(latencies) // 2]:.2f}s</cyan>"
+            logger.info(message)
+        return dict(zip(proxies, results))
+
+    def weights(self, proxies: list[str]) -> dict[str, float]:
+        healthy = {proxy: self.health[proxy] for proxy in proxies
+                   if proxy in self.health and self.health[proxy].ok}
+        if not healthy:
+            # Nothing answered, fall back to spreading evenly rather than leaving sessions without a proxy
+            return {proxy: 1.0 for proxy in proxies}
+
+        # Faster proxies carry more sessions, the floor keeps one very fast probe from taking everything
+        return {proxy: 1 / max(health.latency, settings.PROXY_MIN_LATENCY) for proxy, health in healthy.items()}
+
+    def alive(self, proxy: str, proxies: list[str]) -> bool:
+        health = self.health.get(proxy)
+        return proxy in proxies and (health is None or health.ok)
+
+    def assign(self, session_names: list[str], proxies: list[str] | None = None,
+               bindings: dict[str, str] | None = None) -> list[tuple[str, str | None]]:
+        proxies = self.proxies if proxies is None else proxies
+        if not proxies:
+            return [(session_name, None) for session_name in session_names]
+
+        weights = self.weights(proxies)
+        total = sum(weights.values())
+        shares = {proxy: len(session_names) * weight / total for proxy, weight in weights.items()}
+        counts = {proxy: int(share) for proxy, share in shares.items()}
+        # Largest remainder, so the counts add up to the number of sessions
+        leftover = len(session_names) - sum(counts.values())
+        for proxy in sorted(shares, key=lambda proxy: shares[proxy] - counts[proxy], reverse=True)[:leftover]:
+            counts[proxy] += 1
+
+        # A session keeps the exit IP the server already knows it by, unless that proxy is gone or down. When nothing
+        # answered every proxy counts as alive, the same fallback the weights use
+        everything_down = not any(self.alive(proxy, proxies) for proxy in weights)
+        assigned = {}
+        for session_name in session_names:
+            proxy = (bindings or {}).get(session_name)
+            if proxy and (self.alive(proxy, proxies) or (everything_down and proxy in proxies)):
+                assigned[session_name] = proxy
+                counts[proxy] = counts.get(proxy, 0) - 1
+
+        # The rest go where the latency weighted share is furthest from being filled
+        free = [(-counts[proxy], order, proxy) for order, proxy in enumerate(weights)]
+        heapq.heapify(free)
+        for session_name in session_names:
+            if session_name not in assigned:
+                missing, order, proxy = heapq.heappop(free)
+                assigned[session_name] = proxy
+                heapq.heappush(free, (missing + 1, order, proxy))
+
+        return [(session_name, assigned[session_name]) for session_name in session_names]
+
+    async def run_reprobe(self) -> None:
+        while True:
+            await asyncio.sleep(settings.PROXY_REPROBE_INTERVAL)
+            stale = [proxy for proxy, health in self.health.items() if not health.ok or health.expired()]
+            if stale:
+                await self.check_all(stale, force=True)
+
+    def export(self) -> dict[str, dict]:
+        return {proxy: health.as_dict() for proxy, health in self.health.items()}
+
+    def restore(self, health: dict[str, dict] | None) -> None:
+        for proxy, values in (health or {}).items():
+            self.health[proxy] = ProxyHealth(**values)
+
+
+proxy_pool = ProxyPool()
@@ -0,0 +1,153 @@
+import asyncio
+from collections import deque
+from time import monotonic
+
+from bot.config import settings
+from bot.utils import logger
+from bot.utils.metrics import registry
+
+
+RATE_LIMIT_WAIT = registry.counter('kuroro_rate_limit_wait_seconds_total', 'Time spent waiting for a token',
+                                   ('bucket',))
+RATE_LIMIT_UTILISATION = registry.gauge('kuroro_rate_limit_utilisation', 'Share of the bucket rate in use',
+                                        ('bucket',), aggregate='max')
+
+
+class TokenBucket:
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = monotonic()
+        self._waiters: deque[asyncio.Future] = deque()
+        self._timer: asyncio.TimerHandle | None = None
+
+        self.acquired = 0
+        self.waited = 0.0
+        self._window_started = monotonic()
+        self._window_acquired = 0
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _take(self) -> None:
+        self.tokens -= 1
+        self.acquired += 1
+        self._window_acquired += 1
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self._take()
+            return
+
+        # Queue behind earlier callers so sessions are served in arrival order
+        started = monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._schedule()
+        try:
+            await waiter
+        finally:
+            waited = monotonic() - started
+            self.waited += waited
+            RATE_LIMIT_WAIT.inc(self.name, amount=waited)
+
+    def _schedule(self) -> None:
+        if self._timer is not None or not self._waiters:
+            return
+
+        delay = max(0.0, (1 - self.tokens) / self.rate)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self) -> None:
+        self._timer = None
+        self._refill()
+        while self._waiters and self.tokens >= 1:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._take()
+            waiter.set_result(None)
+
+        while self._waiters and self._waiters[0].done():
+            self._waiters.popleft()
+        self._schedule()
+
+    def penalize(self, seconds: float) -> None:
+        if self.rate <= 0:
+            return
+
+        # Go into debt so nothing is let through before the server asked us to come back
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._schedule()
+
+    def utilisation(self) -> float:
+        now = monotonic()
+        elapsed = now - self._window_started
+        if self.rate <= 0 or elapsed <= 0:
+            return 0.0
+
+        value = self._window_acquired / (elapsed * self.rate)
+        self._window_started, self._window_acquired = now, 0
+        RATE_LIMIT_UTILISATION.set(self.name, value=value)
+        return value
+
+
+class RateLimiter:
+    def __init__(self):
+        self.buckets: dict[str, TokenBucket] = {}
+
+    def _bucket(self, name: str, rate: float) -> TokenBucket | None:
+        if rate <= 0:
+            return None
+
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            bucket = self.buckets[name] = TokenBucket(name, rate, settings.RATE_LIMIT_BURST)
+
+        return bucket
+
+    def _buckets_for(self, proxy: str, endpoint: str) -> list[TokenBucket]:
+        endpoint_rate = settings.RATE_LIMIT_ENDPOINTS.get(endpoint, settings.RATE_LIMIT_PER_ENDPOINT)
+        # Proxy-less sessions are not limited per exit IP, one shared 'direct' bucket would throttle all of them
+        proxy_rate = settings.RATE_LIMIT_PER_PROXY if proxy and proxy != 'direct' else 0
+        buckets = (
+            self._bucket(f"endpoint:{endpoint}", endpoint_rate),
+            self._bucket(f"proxy:{proxy}", proxy_rate),
+            self._bucket("global", settings.RATE_LIMIT_GLOBAL),
+        )
+        return [bucket for bucket in buckets if bucket is not None]
+
+    async def acquire(self, proxy: str, endpoint: str) -> None:
+        for bucket in self._buckets_for(proxy, endpoint):
+            await bucket.acquire()
+
+    def penalize(self, proxy: str, seconds: float | None) -> None:
+        bucket = self.buckets.get(f"proxy:{proxy}")
+        if bucket is not None:
+            bucket.penalize(seconds or 1.0)
+
+    def stats(self) -> dict[str, float]:
+        return {name: bucket.utilisation() for name, bucket in self.buckets.items()}
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        if not stats:
+            return
+
+        busiest = sorted(stats.items(), key=lambda item: item[1], reverse=True)[:3]
+        logger.info("Rate limits | " + " - ".join(f"{name}: <cyan>{value:.0%}</cyan>" for name, value in busiest))
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,110 @@
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import Enum
+from typing import Any
+
+from bot.config import settings
+
+
+class ErrorClass(str, Enum):
+    RATE_LIMITED = 'rate_limited'
+    SERVER = 'server'
+    TIMEOUT = 'timeout'
+    NETWORK = 'network'
+    AUTH = 'auth'
+    CLIENT = 'client'
+    CIRCUIT_OPEN = 'circuit_open'
+    DECODE = 'decode'
+
+
+RETRYABLE = {ErrorClass.RATE_LIMITED, ErrorClass.SERVER, ErrorClass.TIMEOUT, ErrorClass.NETWORK}
+# A write that timed out or broke mid-flight may already have been applied, so
+# writes are only repeated when the server says it did not process them
+RETRYABLE_WRITES = {ErrorClass.RATE_LIMITED}
+RETRYABLE_WRITE_STATUSES = {503}
+
+
+class ApiResult:
+    __slots__ = ('value', 'status', 'error', 'error_class', 'retry_after', 'attempts')
+
+    def __init__(self, value: Any = None, status: int | None = None, error: str | None = None,
+                 error_class: ErrorClass | None = None, retry_after: float | None = None):
+        self.value = value
+        self.status = status
+        self.error = error
+        self.error_class = error_class
+        self.retry_after = retry_after
+        self.attempts = 1
+
+    @property
+    def ok(self) -> bool:
+        return self.error_class is None
+
+    def __repr__(self) -> str:
+        if self.ok:
+            return f"ApiResult(status={self.status}, attempts={self.attempts})"
+
+        return f"ApiResult({self.error_class.value}, status={self.status}, error={self.error!r}, attempts={self.attempts})"
+
+
+def classify_status(status: int) -> ErrorClass | None:
+    if status < 400:
+        return None
+    if status == 429:
+        return ErrorClass.RATE_LIMITED
+    if status in (401, 403):
+        return ErrorClass.AUTH
+    if status >= 500:
+        return ErrorClass.SERVER
+
+    return ErrorClass.CLIENT
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    def __init__(self, attempts: int | None = None, base_delay: float | None = None, max_delay: float | None = None):
+        self.attempts = max(1, attempts or settings.RETRY_ATTEMPTS)
+        self.base_delay = settings.RETRY_BASE_DELAY if base_delay is None else base_delay
+        self.max_delay = settings.RETRY_MAX_DELAY if max_delay is None else max_delay
+
+    def should_retry(self, method: str, result: ApiResult, attempt: int) -> bool:
+        if result.ok or attempt >= self.attempts:
+            return False
+
+        if result.retry_after is not None and result.retry_after > self.max_delay:
+            return False
+
+        if method.upper() == 'GET':
+            return result.error_class in RETRYABLE
+
+        return result.error_class in RETRYABLE_WRITES or result.status in RETRYABLE_WRITE_STATUSES
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        # Full jitter keeps thousands of sessions from retrying in lockstep
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        return delay
+
+
+retry_policy = RetryPolicy()
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from bot.config import settings
+from bot.utils.metrics import registry
+
+
+SAVE_CALLS = registry.counter('kuroro_save_calls_total', 'Telemetry saves the cycle asked for')
+SAVE_POSTS = registry.counter('kuroro_save_posts_total', 'Telemetry POSTs actually sent, after batching')
+
+
+class SaveBuffer:
+    def __init__(self, send: Callable[[Any, list], Awaitable]):
+        self._send = send
+        self._points: list[dict] = []
+        self._http_client = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+        self.calls = 0
+        self.posts = 0
+
+    def add(self, http_client, points: list[dict]) -> None:
+        self.calls += 1
+        SAVE_CALLS.inc()
+        self._http_client = http_client
+        self._points.extend(points)
+
+        if len(self._points) >= settings.SAVE_BATCH_SIZE:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(settings.SAVE_FLUSH_INTERVAL,
+                                                                self._schedule_flush)
+
+    def _schedule_flush(self) -> None:
+        task = asyncio.create_task(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._points:
+            return
+
+        points, self._points = self._points, []
+        self.posts += 1
+        SAVE_POSTS.inc()
+        await self._send(self._http_client, points)
+
+    async def drain(self) -> None:
+        await self.flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,174 @@
+import asyncio
+import heapq
+import random
+from collections import deque
+from itertools import count
+from time import monotonic
+
+from bot.config import settings
+from bot.exceptions import InvalidSession
+from bot.utils import logger
+from .tapper import Tapper
+from .ratelimit import rate_limiter
+from .telegram import telegram_pool
+from .checkpoints import checkpoint_store
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Scheduler:
+    def __init__(self, workers: int | None = None, ramp_up: int | None = None):
+        self.workers = max(1, workers or settings.SCHEDULER_WORKERS)
+        self.ramp_up = settings.RAMP_UP_TIME if ramp_up is None else ramp_up
+
+        self._heap: list[tuple[float, int, Tapper]] = []
+        self._seq = count()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._proxies: dict[Tapper, str | None] = {}
+        self._started: set[Tapper] = set()
+
+        self.running = 0
+        self.cycles = 0
+        self.stopping = False
+        self.lateness = deque(maxlen=1000)
+
+    @property
+    def sessions(self) -> int:
+        return len(self._proxies)
+
+    def add(self, tapper: Tapper, proxy: str | None, delay: float = 0) -> None:
+        self._proxies[tapper] = proxy
+        self.schedule(tapper, delay)
+
+    def schedule(self, tapper: Tapper, delay: float) -> None:
+        heapq.heappush(self._heap, (monotonic() + delay, next(self._seq), tapper))
+        self._wakeup.set()
+
+    async def remove(self, tapper: Tapper) -> None:
+        self._proxies.pop(tapper, None)
+        self._started.discard(tapper)
+        await tapper.close()
+        self._wakeup.set()
+
+    def add_all(self, tappers: list[tuple[Tapper, str | None]]) -> None:
+        # Sessions with a checkpoint pick up where they left off, only the ones that are due get ramped up
+        due = []
+        for tapper, proxy in tappers:
+            remaining = checkpoint_store.get(tapper.session_name).remaining()
+            if remaining > 0:
+                self.add(tapper, proxy, delay=min(remaining, max(settings.SLEEP_TIME[1], settings.WAKE_BOUNDS[1])))
+            else:
+                due.append((tapper, proxy))
+
+        if len(due) < len(tappers):
+            logger.info(f"Scheduler | Resuming <cyan>{len(tappers) - len(due)}</cyan> session(s) from checkpoints, "
+                        f"<cyan>{len(due)}</cyan> due now")
+
+        step = self.ramp_up / len(due) if due else 0
+        for index, (tapper, proxy) in enumerate(due):
+            self.add(tapper, proxy, delay=index * step + random.uniform(0, step))
+
+    def stop(self) -> None:
+        if not self.stopping:
+            logger.info(f"Scheduler | Stopping, waiting for <cyan>{self.running}</cyan> running cycle(s)")
+        self.stopping = True
+        self._wakeup.set()
+
+    async def _dispatch(self) -> None:
+        while self._proxies and not self.stopping:
+            self._wakeup.clear()
+            now = monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                due, _, tapper = heapq.heappop(self._heap)
+                self._queue.put_nowait((due, tapper))
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_cycle(self, tapper: Tapper) -> int | None:
+        if tapper not in self._started:
+            self._started.add(tapper)
+            await tapper.start(proxy=self._proxies[tapper])
+
+        return await tapper.run_cycle()
+
+    async def _worker(self) -> None:
+        while True:
+            due, tapper = await self._queue.get()
+            if self.stopping:
+                self._queue.task_done()
+                continue
+
+            self.lateness.append(monotonic() - due)
+            self.running += 1
+            try:
+                sleep_time = await self._run_cycle(tapper)
+            except InvalidSession:
+                logger.error(f"{tapper.session_name} | Invalid Session")
+                sleep_time = None
+            except Exception as error:
+                logger.error(f"{tapper.session_name} | Unknown error: {error}")
+                sleep_time = 60
+            finally:
+                self.running -= 1
+                self.cycles += 1
+                self._queue.task_done()
+
+            if sleep_time is None:
+                await self.remove(tapper)
+            elif self.stopping:
+                continue
+            else:
+                checkpoint_store.record_cycle(tapper.session_name, sleep_time)
+                tapper.info(f"Sleep <y>{sleep_time}s</y>")
+                self.schedule(tapper, sleep_time)
+
+    def stats(self) -> dict:
+        lateness = list(self.lateness)
+        return {
+            'sessions': self.sessions,
+            'scheduled': len(self._heap),
+            'queue_depth': self._queue.qsize(),
+            'running': self.running,
+            'cycles': self.cycles,
+            'lateness_p50': percentile(lateness, 0.5),
+            'lateness_p99': percentile(lateness, 0.99),
+        }
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(settings.SCHEDULER_REPORT_INTERVAL)
+            stats = self.stats()
+            logger.info(f"Scheduler | Sessions: <cyan>{stats['sessions']}</cyan> - "
+                        f"Queue: <cyan>{stats['queue_depth']}</cyan> - "
+                        f"Running: <cyan>{stats['running']}</cyan>/<cyan>{self.workers}</cyan> - "
+                        f"Cycles: <cyan>{stats['cycles']}</cyan> - "
+                        f"Lateness p50/p99: <cyan>{stats['lateness_p50']:.2f}s</cyan>/"
+                        f"<cyan>{stats['lateness_p99']:.2f}s</cyan>")
+            rate_limiter.log_stats()
+            telegram_pool.log_stats()
+
+    async def run(self) -> None:
+        helpers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        helpers.append(asyncio.create_task(self._report()))
+        try:
+            await self._dispatch()
+            # Cycles that already started get to finish, so their writes are not cut off half way
+            deadline = monotonic() + settings.SHUTDOWN_TIMEOUT
+            while self.running and monotonic() < deadline:
+                await asyncio.sleep(0.1)
+        finally:
+            for task in helpers:
+                task.cancel()
+            await asyncio.gather(*helpers, return_exceptions=True)
+            await asyncio.gather(*(tapper.close() for tapper in list(self._proxies)), return_exceptions=True)
@@ -0,0 +1,131 @@
+from bot.config import settings
+from .clock import clock
+from .models import DecodeError, InventoryItem, PlayerSnapshot
+
+
+class PlayerState:
+    __slots__ = ('coins', 'shards', 'energy', 'max_energy', 'beast_level', 'raffle_tickets', 'inventory',
+                 'energy_regen', 'coin_rate', 'earned_at', 'synced_at', 'updated_at', 'dirty')
+
+    def __init__(self):
+        self.coins = 0
+        self.shards = 0
+        self.energy = 0
+        self.max_energy = 0
+        self.beast_level = 0
+        self.raffle_tickets = 0
+        self.inventory: dict[str, int] = {}
+        # Energy per second, learned from how far the server moved ahead of us between two syncs
+        self.energy_regen = 0.0
+        # Coins per second accrued while away, from CoinsEarnedAway and the time since the last claim
+        self.coin_rate = 0.0
+        self.earned_at = 0.0
+        self.synced_at = 0.0
+        self.updated_at = 0.0
+        self.dirty = True
+
+    def needs_resync(self) -> bool:
+        # Until the regeneration rate is learned projected energy can't grow, so keep reading the real value
+        return self.dirty or not self.energy_regen or clock.time() - self.synced_at >= settings.STATE_RESYNC_INTERVAL
+
+    def mark_dirty(self) -> None:
+        self.dirty = True
+
+    def sync(self, user_res: PlayerSnapshot, raffle_res: dict | None, inventory_items: list[InventoryItem] | None) -> None:
+        now = clock.time()
+        expected_energy, last_update = self.projected_energy(now), self.updated_at
+        self.update_from(user_res)
+
+        below_max = not self.max_energy or self.energy < self.max_energy
+        if self.synced_at and not self.dirty and below_max:
+            observed = (self.energy - expected_energy) / max(1.0, now - last_update) + self.energy_regen
+            self.energy_regen = max(0.0, observed if not self.energy_regen else (self.energy_regen + observed) / 2)
+
+        if raffle_res is not None:
+            self.raffle_tickets = raffle_res.get("count", 0)
+        if inventory_items is not None:
+            self.inventory = {item.item_id: item.quantity for item in inventory_items}
+        self.synced_at = self.updated_at = now
+        # A failed side read keeps what we knew and is read again next cycle, rather than an hour of no items
+        self.dirty = raffle_res is None or inventory_items is None
+
+    def projected_energy(self, now: float | None = None) -> int:
+        if not self.updated_at or not self.energy_regen:
+            return self.energy
+
+        elapsed = (now or clock.time()) - self.updated_at
+        projected = self.energy + int(elapsed * self.energy_regen)
+        return min(projected, self.max_energy) if self.max_energy else projected
+
+    def advance(self) -> None:
+        now = clock.time()
+        self.energy = self.projected_energy(now)
+        self.updated_at = now
+
+    def update_from(self, response) -> None:
+        if isinstance(response, dict):
+            try:
+                response = PlayerSnapshot.decode(response)
+            except DecodeError:
+                self.mark_dirty()
+                return
+        if not isinstance(response, PlayerSnapshot):
+            return
+
+        if response.coins is not None:
+            self.coins = response.coins
+        if response.energy is not None:
+            self.energy = response.energy
+            self.updated_at = clock.time()
+        if response.max_energy is not None:
+            self.max_energy = response.max_energy
+        if response.shards is not None:
+            self.shards = response.shards
+        if response.beast_level is not None:
+            self.beast_level = response.beast_level
+
+    def apply_coins_earned(self, coins) -> None:
+        if isinstance(coins, (int, float)):
+            self.coins += coins
+
+    def record_earnings(self, coins) -> None:
+        if not isinstance(coins, (int, float)):
+            return
+
+        now = clock.time()
+        if self.earned_at:
+            observed = coins / max(1.0, now - self.earned_at)
+            self.coin_rate = observed if not self.coin_rate else (self.coin_rate + observed) / 2
+        self.earned_at = now
+
+    def apply_mining(self, mine_amount: int, response) -> None:
+        self.energy = max(0, self.energy - mine_amount)
+        self.shards += mine_amount
+        self.update_from(response)
+
+    def apply_feeding(self, feed_amount: int, response) -> None:
+        self.shards = max(0, self.shards - feed_amount)
+        self.update_from(response)
+
+    def apply_buy_item(self, item_id: str, cost: int) -> None:
+        self.coins -= cost
+        self.inventory[item_id] = self.inventory.get(item_id, 0) + 1
+
+    def apply_use_item(self, item_id: str, response) -> None:
+        self.inventory[item_id] = max(0, self.inventory.get(item_id, 0) - 1)
+        if isinstance(response, dict) and "energySnapshot" in response:
+            self.update_from(response)
+        else:
+            # Items change balances in ways we can not predict, so ask the server next time
+            self.mark_dirty()
+
+    def apply_raffle(self, response) -> None:
+        self.raffle_tickets = max(0, self.raffle_tickets - 1)
+        if isinstance(response, dict) and response.get("itemId"):
+            item_id = response["itemId"]
+            self.inventory[item_id] = self.inventory.get(item_id, 0) + response.get("quantity", 1)
+        else:
+            self.mark_dirty()
+
+    def apply_buy_upgrade(self, cost: int) -> None:
+        self.coins -= cost
@@ -1,12 +1,8 @@
 import asyncio
-import json
-import random
-from time import time
-from urllib.parse import unquote, quote
+from time import monotonic
+from urllib.parse import unquote, quote, urlparse
 
 import aiohttp
-from aiocfscrape import CloudflareScraper
-from aiohttp_proxy import ProxyConnector
 from better_proxy import Proxy
 from pyrogram import Client
 from pyrogram.errors import Unauthorized, UserDeactivated, AuthKeyUnregistered, FloodWait
@@ -18,10 +14,31 @@ from bot.config import settings
 from typing import Any, Callable
 import functools
 from bot.utils import logger
+from bot.utils.logger import enabled as log_enabled, log
+from bot.utils.metrics import registry
 from bot.exceptions import InvalidSession
 from .headers import headers
+from .connection import connection_manager
+from .user_agents import user_agent_store
+from .web_data import web_data_cache
+from .executor import ReadPhase
+from .save_buffer import SaveBuffer
+from .retry import ApiResult, ErrorClass, RETRYABLE, classify_status, parse_retry_after, retry_policy
+from .breaker import breakers
+from .ratelimit import rate_limiter
+from .state import PlayerState
+from .cassette import cassette
+from .proxies import proxy_label, proxy_pool
+from .telegram import telegram_pool
+from .peers import PEER_ERRORS, peer_cache
+from .planner import CyclePlanner
+from .codec import DECODE_ERRORS, loads
+from .models import BallState, DailyStreakState, DecodeError, InventoryItem, Listing, PlayerSnapshot, Upgrade
+from .onboarding import COMPLETED, STEPS, TRANSITIONS, needs_onboarding, remaining_steps
+from .checkpoints import checkpoint_store, today
+from .clock import clock
+from .wake import next_wake
 from pyrogram.raw.types import InputBotAppShortName, InputNotifyPeer, InputPeerNotifySettings
-import inspect
 
 def error_handler(func: Callable):
     @functools.wraps(func)
@@ -29,13 +46,30 @@ def error_handler(func: Callable):
         try:
             return await func(*args, **kwargs)
         except Exception as e:
-            caller_frame = inspect.stack()[1]
-            caller_function_name = caller_frame.function
-            
-            logger.error(f"Error in function '{caller_function_name}': {e}")
-            await asyncio.sleep(1)
+            logger.error(f"Error in function '{func.__name__}': {e}")
     return wrapper
 
+REQUESTS = registry.counter('kuroro_requests_total', 'API requests by endpoint, status and proxy',
+                            ('endpoint', 'status', 'proxy'))
+REQUEST_LATENCY = registry.histogram('kuroro_request_duration_seconds', 'API request latency',
+                                     ('endpoint', 'status', 'proxy'))
+REQUESTS_IN_FLIGHT = registry.gauge('kuroro_requests_in_flight', 'API requests waiting for a response',
+                                    ('endpoint',))
+
+
+@functools.lru_cache(maxsize=None)
+def api_host(base_url: str) -> str:
+    return urlparse(base_url).netloc
+
+
+def metric_endpoint(endpoint: str | None) -> str:
+    # Ball hits carry the user id in the path, keep one series for all of them
+    if endpoint and '/tg-' in endpoint:
+        return endpoint.split('/tg-')[0] + '/{ball}'
+
+    return endpoint or ''
+
+
 class Tapper:
     def __init__(self, tg_client: Client):
         self.session_name = tg_client.name
@@ -48,81 +82,58 @@ class Tapper:
         self.start_param = None
         self.peer = None
         self.first_run = None
+        self.save_buffer = SaveBuffer(send=self.send_save)
+        self.log_counts: dict[str, int] = {}
+        self.proxy = None
+        self.proxy_label = proxy_label(None)
+        self.http_client = None
+        self.state: PlayerState | None = None
+        self.auth_expired = False
 
-        self.session_ug_dict = self.load_user_agents() or []
-
-        headers['User-Agent'] = self.check_user_agent()
+        self.user_agent = user_agent_store.get(self.session_name)
 
     async def generate_random_user_agent(self):
         return generate_random_user_agent(device_type='android', browser_type='chrome')
 
-    def info(self, message):
-        from bot.utils import info
-        info(f"<light-yellow>{self.session_name}</light-yellow> | {message}")
-
-    def debug(self, message):
-        from bot.utils import debug
-        debug(f"<light-yellow>{self.session_name}</light-yellow> | {message}")
+    @property
+    def rng(self):
+        return cassette.rng(self.session_name)
 
-    def warning(self, message):
-        from bot.utils import warning
-        warning(f"<light-yellow>{self.session_name}</light-yellow> | {message}")
+    async def sleep(self, delay: float) -> None:
+        await asyncio.sleep(delay * settings.DELAY_SCALE)
 
-    def error(self, message):
-        from bot.utils import error
-        error(f"<light-yellow>{self.session_name}</light-yellow> | {message}")
+    def log(self, level: str, message, sample: str | None = None):
+        if not log_enabled(level):
+            return
 
-    def critical(self, message):
-        from bot.utils import critical
-        critical(f"<light-yellow>{self.session_name}</light-yellow> | {message}")
+        if sample and settings.LOG_SAMPLE_RATE > 1:
+            count = self.log_counts.get(sample, 0)
+            self.log_counts[sample] = count + 1
+            if count % settings.LOG_SAMPLE_RATE:
+                return
 
-    def success(self, message):
-        from bot.utils import success
-        success(f"<light-yellow>{self.session_name}</light-yellow> | {message}")
-
-    def save_user_agent(self):
-        user_agents_file_name = "user_agents.json"
-
-        if not any(session['session_name'] == self.session_name for session in self.session_ug_dict):
-            user_agent_str = generate_random_user_agent()
-
-            self.session_ug_dict.append({
-                'session_name': self.session_name,
-                'user_agent': user_agent_str})
-
-            with open(user_agents_file_name, 'w') as user_agents:
-                json.dump(self.session_ug_dict, user_agents, indent=4)
-
-            logger.success(f"<light-yellow>{self.session_name}</light-yellow> | User agent saved successfully")
-
-            return user_agent_str
-
-    def load_user_agents(self):
-        user_agents_file_name = "user_agents.json"
-
-        try:
-            with open(user_agents_file_name, 'r') as user_agents:
-                session_data = json.load(user_agents)
-                if isinstance(session_data, list):
-                    return session_data
+        # Hot paths pass a callable, so nothing is formatted for a disabled level or a sampled out line
+        if callable(message):
+            message = message()
+        log(level, f"<light-yellow>{self.session_name}</light-yellow> | {message}")
 
-        except FileNotFoundError:
-            logger.warning("User agents file not found, creating...")
+    def info(self, message, sample: str | None = None):
+        self.log("INFO", message, sample)
 
-        except json.JSONDecodeError:
-            logger.warning("User agents file is empty or corrupted.")
+    def debug(self, message, sample: str | None = None):
+        self.log("DEBUG", message, sample)
 
-        return []
+    def warning(self, message, sample: str | None = None):
+        self.log("WARNING", message, sample)
 
-    def check_user_agent(self):
-        load = next(
-            (session['user_agent'] for session in self.session_ug_dict if session['session_name'] == self.session_name),
-            None)
+    def error(self, message, sample: str | None = None):
+        self.log("ERROR", message, sample)
 
-        if load is None:
-            return self.save_user_agent()
+    def critical(self, message, sample: str | None = None):
+        self.log("CRITICAL", message, sample)
 
-        return load
+    def success(self, message, sample: str | None = None):
+        self.log("SUCCESS", message, sample)
 
     async def get_tg_web_data(self, proxy: str | None) -> str:
         
@@ -138,108 +149,232 @@ class Tapper:
         else:
             proxy_dict = None
 
-        self.tg_client.proxy = proxy_dict
-
         try:
-            if not self.tg_client.is_connected:
-                try:
-                    await self.tg_client.connect()
+            cached = peer_cache.get(self.session_name)
+            async with telegram_pool.session(self.tg_client, proxy=proxy_dict):
+                peer = peer_cache.bot_peer(cached) if cached else await self.resolve_bot_peer()
+
+                ref_id = settings.REF_ID if self.rng.randint(0, 100) <= 85 and settings.REF_ID != '' else "ref-22DBDBE5"
 
-                except (Unauthorized, UserDeactivated, AuthKeyUnregistered):
-                    raise InvalidSession(self.session_name)
-            
-            while True:
                 try:
-                    peer = await self.tg_client.resolve_peer('KuroroRanchBot')
-                    break
-                except FloodWait as fl:
-                    fls = fl.value
-
-                    logger.warning(f"{self.session_name} | FloodWait {fl}")
-                    logger.info(f"{self.session_name} | Sleep {fls}s")
-                    await asyncio.sleep(fls + 3)
-            
-            ref_id = settings.REF_ID if random.randint(0, 100) <= 85 and settings.REF_ID != '' else "ref-22DBDBE5"
-            
-            web_view = await self.tg_client.invoke(RequestAppWebView(
-                peer=peer,
-                app=InputBotAppShortName(bot_id=peer, short_name="ranch"),
-                platform='android',
-                write_allowed=True,
-                start_param=ref_id
-            ))
-
-            auth_url = web_view.url
-            tg_web_data = unquote(string=auth_url.split('tgWebAppData=')[1].split('&tgWebAppVersion')[0])
-
-            me = await self.tg_client.get_me()
-            self.user_id = me.id
-
-            if self.tg_client.is_connected:
-                await self.tg_client.disconnect()
+                    web_view = await self.request_web_view(peer, ref_id)
+                except PEER_ERRORS:
+                    if not cached:
+                        raise
+                    self.warning("Cached bot peer is no longer valid, resolving again")
+                    peer_cache.invalidate(self.session_name)
+                    cached = None
+                    peer = await self.resolve_bot_peer()
+                    web_view = await self.request_web_view(peer, ref_id)
+
+                auth_url = web_view.url
+                tg_web_data = unquote(string=auth_url.split('tgWebAppData=')[1].split('&tgWebAppVersion')[0])
+
+                if cached is None:
+                    me = await self.tg_client.get_me()
+                    cached = peer_cache.store(self.session_name, peer, me)
+
+            me = cached['me']
+            self.user_id = me['id']
+            self.username, self.first_name, self.last_name = me['username'], me['first_name'], me['last_name']
 
             return tg_web_data
 
+        except (Unauthorized, UserDeactivated, AuthKeyUnregistered):
+            await telegram_pool.release(self.tg_client)
+            raise InvalidSession(self.session_name)
+
         except InvalidSession as error:
             raise error
 
         except Exception as error:
+            # The connection may be in a bad state, start from a fresh one next time
+            await telegram_pool.release(self.tg_client)
             logger.error(f"{self.session_name} | Unknown error: {error}")
             await asyncio.sleep(delay=3)
         
         
+    async def resolve_bot_peer(self):
+        while True:
+            try:
+                return await self.tg_client.resolve_peer('KuroroRanchBot')
+            except FloodWait as fl:
+                fls = fl.value
+
+                logger.warning(f"{self.session_name} | FloodWait {fl}")
+                logger.info(f"{self.session_name} | Sleep {fls}s")
+                await asyncio.sleep(fls + 3)
+
+    async def request_web_view(self, peer, ref_id: str):
+        return await self.tg_client.invoke(RequestAppWebView(
+            peer=peer,
+            app=InputBotAppShortName(bot_id=peer, short_name="ranch"),
+            platform='android',
+            write_allowed=True,
+            start_param=ref_id
+        ))
+
+    async def fetch_tg_web_data(self) -> str | None:
+        if cassette.replaying:
+            return cassette.replay_web_data(self.session_name)
+
+        tg_web_data = await self.get_tg_web_data(proxy=self.proxy)
+        if cassette.recording:
+            cassette.record_web_data(self.session_name, tg_web_data)
+        return tg_web_data
+
     async def join_and_mute_tg_channel(self, link: str):
         link = link.replace('https://t.me/', "")
-        if not self.tg_client.is_connected:
-            try:
-                await self.tg_client.connect()
-            except Exception as error:
-                logger.error(f"{self.session_name} | (Task) Connect failed: {error}")
         try:
-            chat = await self.tg_client.get_chat(link)
-            chat_username = chat.username if chat.username else link
-            chat_id = chat.id
-            try:
-                await self.tg_client.get_chat_member(chat_username, "me")
-            except Exception as error:
-                if error.ID == 'USER_NOT_PARTICIPANT':
-                    await asyncio.sleep(delay=3)
-                    response = await self.tg_client.join_chat(link)
-                    logger.info(f"{self.session_name} | Joined to channel: <y>{response.username}</y>")
-                    
-                    try:
-                        peer = await self.tg_client.resolve_peer(chat_id)
-                        await self.tg_client.invoke(account.UpdateNotifySettings(
-                            peer=InputNotifyPeer(peer=peer),
-                            settings=InputPeerNotifySettings(mute_until=2147483647)
-                        ))
-                        logger.info(f"{self.session_name} | Successfully muted chat <y>{chat_username}</y>")
-                    except Exception as e:
-                        logger.info(f"{self.session_name} | (Task) Failed to mute chat <y>{chat_username}</y>: {str(e)}")
-                    
-                    
-                else:
-                    logger.error(f"{self.session_name} | (Task) Error while checking TG group: <y>{chat_username}</y>")
+            async with telegram_pool.session(self.tg_client, proxy=self.tg_client.proxy):
+                chat = await self.tg_client.get_chat(link)
+                chat_username = chat.username if chat.username else link
+                chat_id = chat.id
+                try:
+                    await self.tg_client.get_chat_member(chat_username, "me")
+                except Exception as error:
+                    if error.ID == 'USER_NOT_PARTICIPANT':
+                        await asyncio.sleep(delay=3)
+                        response = await self.tg_client.join_chat(link)
+                        logger.info(f"{self.session_name} | Joined to channel: <y>{response.username}</y>")
+
+                        try:
+                            peer = await self.tg_client.resolve_peer(chat_id)
+                            await self.tg_client.invoke(account.UpdateNotifySettings(
+                                peer=InputNotifyPeer(peer=peer),
+                                settings=InputPeerNotifySettings(mute_until=2147483647)
+                            ))
+                            logger.info(f"{self.session_name} | Successfully muted chat <y>{chat_username}</y>")
+                        except Exception as e:
+                            logger.info(f"{self.session_name} | (Task) Failed to mute chat <y>{chat_username}</y>: {str(e)}")
+
+                    else:
+                        logger.error(f"{self.session_name} | (Task) Error while checking TG group: <y>{chat_username}</y>")
 
-            if self.tg_client.is_connected:
-                await self.tg_client.disconnect()
         except Exception as error:
             logger.error(f"{self.session_name} | (Task) Error while join tg channel: {error}")
 
-    @error_handler
+    async def _send(self, http_client, method, full_url, label, is_api, **kwargs) -> ApiResult:
+        status = 'error'
+        REQUESTS_IN_FLIGHT.inc(label)
+        started = monotonic()
+        authorization = http_client.headers.get('authorization')
+        try:
+            async with http_client.request(method, full_url, ssl = False, **kwargs) as response:
+                status = str(response.status)
+                error_class = classify_status(response.status)
+                if error_class is not None:
+                    if response.status == 401 and is_api:
+                        web_data_cache.invalidate(self.session_name,
+                                                  authorization.removeprefix("Bearer ") if authorization else None)
+                    return ApiResult(status=response.status, error=response.reason, error_class=error_class,
+                                     retry_after=parse_retry_after(response.headers.get("Retry-After")))
+
+                content_type = response.headers.get("Content-Type", "")
+                if "application/json" in content_type:
+                    try:
+                        value = loads(await response.read())
+                    except DECODE_ERRORS as error:
+                        return ApiResult(status=response.status, error=f"Malformed JSON: {error}",
+                                         error_class=ErrorClass.DECODE)
+                else:
+                    value = await response.text()
+                return ApiResult(value=value, status=response.status)
+
+        except asyncio.TimeoutError:
+            status = 'timeout'
+            return ApiResult(error="Request timed out", error_class=ErrorClass.TIMEOUT)
+
+        except aiohttp.ClientError as error:
+            return ApiResult(error=str(error) or type(error).__name__, error_class=ErrorClass.NETWORK)
+
+        finally:
+            REQUESTS_IN_FLIGHT.dec(label)
+            REQUESTS.inc(label, status, self.proxy_label)
+            REQUEST_LATENCY.observe(monotonic() - started, label, status, self.proxy_label)
+
+    async def request(self, http_client, method, endpoint=None, url=None, model=None, **kwargs) -> ApiResult:
+        full_url = url or f"{settings.API_BASE_URL}{endpoint or ''}"
+        label = metric_endpoint(endpoint) if not url else url
+        host = api_host(settings.API_BASE_URL) if not url else None
+        attempt = 1
+        reauthorized = False
+        while True:
+            if self.auth_expired and host:
+                # The server already turned our web app data down this cycle, more requests would only fail too
+                result = ApiResult(status=401, error="Web app data rejected", error_class=ErrorClass.AUTH)
+                result.attempts = attempt
+                return result
+
+            if host:
+                await rate_limiter.acquire(self.proxy_label, label)
+
+            circuits = breakers.acquire(host, label) if host else []
+            if circuits is None:
+                result = ApiResult(error="Circuit open", error_class=ErrorClass.CIRCUIT_OPEN)
+                result.attempts = attempt
+                return result
+
+            # Anything raised before the outcome is recorded (cancellation included) must hand back the
+            # half-open probe slot, or the circuit stays shut for good
+            recorded = False
+            try:
+                if cassette.replaying:
+                    result = await cassette.replay_response(self.session_name, method, label)
+                else:
+                    started = monotonic()
+                    result = await self._send(http_client, method, full_url, label, is_api=not url, **kwargs)
+                    if cassette.recording:
+                        cassette.record_response(self.session_name, method, label, result, monotonic() - started)
+                if model is not None and result.ok:
+                    try:
+                        result.value = model(result.value)
+                    except DecodeError as error:
+                        result = ApiResult(status=result.status, error=str(error), error_class=ErrorClass.DECODE)
+                result.attempts = attempt
+                for circuit in circuits:
+                    circuit.record(result.error_class not in RETRYABLE)
+                recorded = True
+            finally:
+                if not recorded:
+                    for circuit in circuits:
+                        circuit.release()
+            if result.error_class == ErrorClass.RATE_LIMITED:
+                rate_limiter.penalize(self.proxy_label, result.retry_after)
+
+            if result.status in (401, 403) and host and checkpoint_store.get(self.session_name).ban_checked_at:
+                # Bans show up as auth errors first, so the next cycle starts with a ban check
+                checkpoint_store.update(self.session_name, ban_checked_at=0)
+
+            if result.status == 401 and host:
+                # _send dropped the cached web app data, fetch a new one and repeat the request once
+                if not reauthorized and await self.authorize(http_client):
+                    reauthorized = True
+                    self.debug(lambda: f"{method} {label} was unauthorized, retrying with fresh web app data")
+                    continue
+                self.auth_expired = True
+                return result
+
+            if not retry_policy.should_retry(method, result, attempt):
+                return result
+
+            delay = retry_policy.delay(attempt, result.retry_after)
+            self.debug(lambda: f"{method} {label} failed ({result.error_class.value}), retry in <y>{delay:.1f}s</y>")
+            await asyncio.sleep(delay)
+            attempt += 1
+
     async def make_request(self, http_client, method, endpoint=None, url=None, **kwargs):
-        full_url = url or f"https://ranch-api.kuroro.com/api{endpoint or ''}"
-        response = await http_client.request(method, full_url, ssl = False, **kwargs)
-        response.raise_for_status()
-        content_type = response.headers.get("Content-Type", "")
-        if "application/json" in content_type:
-            return await response.json()
-        else:
-            return await response.text()
-        
+        result = await self.request(http_client, method, endpoint=endpoint, url=url, **kwargs)
+        if not result.ok:
+            self.error(f"{method} {endpoint or url} failed after {result.attempts} attempt(s): "
+                       f"{result.error_class.value} {result.status or ''} {result.error}")
+            return None
+
+        return result.value
+
     @error_handler
     async def get_user(self, http_client):
-       return await self.make_request(http_client, 'GET', endpoint="/Game/GetPlayerState")
+       return await self.make_request(http_client, 'GET', endpoint="/Game/GetPlayerState", model=PlayerSnapshot.decode)
     
     @error_handler
     async def get_onboard(self, http_client):
@@ -256,7 +391,7 @@ class Tapper:
     @error_handler
     async def get_listings(self, http_client):
        await self.save(http_client=http_client,x = [10,450],y = [10,600])
-       return await self.make_request(http_client, 'GET', endpoint="/CoinsShop/GetListings")
+       return await self.make_request(http_client, 'GET', endpoint="/CoinsShop/GetListings", model=Listing.decode_list)
     
     @error_handler
     async def buy_item(self, http_client,itemId):
@@ -267,7 +402,7 @@ class Tapper:
     @error_handler
     async def get_daily_streak_state(self, http_client):
        await self.save(http_client=http_client,x = [10,450],y = [10,600])
-       return await self.make_request(http_client, 'GET', endpoint="/DailyStreak/GetState")
+       return await self.make_request(http_client, 'GET', endpoint="/DailyStreak/GetState", model=DailyStreakState.decode)
     
     @error_handler
     async def claim_daily_bonus(self, http_client):
@@ -276,7 +411,7 @@ class Tapper:
     
     @error_handler
     async def perform_farming(self, http_client,mine_amount):
-        await self.save(http_client=http_client,x=[100,200],y=[228,385],n = random.randint(int(mine_amount)-5,int(mine_amount)))
+        await self.save(http_client=http_client,x=[100,200],y=[228,385],n = self.rng.randint(int(mine_amount)-5,int(mine_amount)))
         data = {
                 "mineAmount": mine_amount,
                 "feedAmount": 0
@@ -285,7 +420,7 @@ class Tapper:
 
     @error_handler
     async def perform_feeding(self, http_client,feed_amount):
-        await self.save(http_client=http_client,x=[3,85],y=[200,357],n = random.randint(int(feed_amount)-5,int(feed_amount)))
+        await self.save(http_client=http_client,x=[3,85],y=[200,357],n = self.rng.randint(int(feed_amount)-5,int(feed_amount)))
         data = {
                 "mineAmount": 0,
                 "feedAmount": feed_amount
@@ -295,7 +430,7 @@ class Tapper:
     @error_handler
     async def get_purchasable_upgrades(self, http_client):
         await self.save(http_client=http_client,x = [10,450],y = [10,600])
-        return await self.make_request(http_client, 'GET', endpoint="/Upgrades/GetPurchasableUpgrades")
+        return await self.make_request(http_client, 'GET', endpoint="/Upgrades/GetPurchasableUpgrades", model=Upgrade.decode_list)
 
     @error_handler
     async def buy_upgrade(self, http_client,upgrade_id):
@@ -310,7 +445,7 @@ class Tapper:
     @error_handler
     async def get_inventory(self, http_client):
         await self.save(http_client=http_client,x = [10,450],y = [10,600])
-        return await self.make_request(http_client, 'GET', endpoint="/Inventory/GetInventory")
+        return await self.make_request(http_client, 'GET', endpoint="/Inventory/GetInventory", model=InventoryItem.decode_list)
     
     @error_handler
     async def get_raffle_tickets(self, http_client):
@@ -319,7 +454,7 @@ class Tapper:
     
     @error_handler
     async def get_ball_state(self, http_client):
-        return await self.make_request(http_client, 'GET', endpoint="/EnergyBalls/GetEnergyBallState")
+        return await self.make_request(http_client, 'GET', endpoint="/EnergyBalls/GetEnergyBallState", model=BallState.decode)
     
     @error_handler
     async def use_item(self, http_client,itemId):
@@ -335,13 +470,16 @@ class Tapper:
     
     @error_handler
     async def hit_ball(self, http_client,user_id,hits):
-        await self.save(http_client=http_client,x=[50,300],y=[50,300],n = random.randint(int(hits) - 5,int(hits)))
+        await self.save(http_client=http_client,x=[50,300],y=[50,300],n = self.rng.randint(int(hits) - 5,int(hits)))
         data = {"hits":hits}
         return await self.make_request(http_client, 'POST', endpoint=f"/EnergyBalls/TakeHitsCombo/tg-{user_id}:main",json = data)
     
-    @error_handler
     async def save(self, http_client,x:list, y:list, n=1):
-        data = [{"x":random.randint(*x),"y":random.randint(*y)}]*n
+        data = [{"x":self.rng.randint(*x),"y":self.rng.randint(*y)}]*n
+        self.save_buffer.add(http_client, data)
+
+    @error_handler
+    async def send_save(self, http_client, data: list):
         return await self.make_request(http_client, 'POST', endpoint=f"/Bf/Save",json = data)
     
     @error_handler
@@ -355,291 +493,311 @@ class Tapper:
         return await self.make_request(http_client, 'POST', endpoint=f"/Reincarnate/Reincarnate",json = data)
 
     @error_handler
-    async def check_proxy(self, http_client: aiohttp.ClientSession, proxy: Proxy) -> None:
-        response = await self.make_request(http_client, 'GET', url='https://httpbin.org/ip', timeout=aiohttp.ClientTimeout(5))
-        if response and response.get('origin',None):
-            ip = response.get('origin',None)
-            logger.info(f"{self.session_name} | Proxy IP: {ip}")
+    async def check_proxy(self, proxy: str) -> None:
+        health = await proxy_pool.check(proxy)
+        if health.ok and health.ip:
+            logger.info(f"{self.session_name} | Proxy IP: {health.ip}")
         else:
-            logger.warning(f"{self.session_name} | Can't check proxy {proxy}")
+            logger.warning(f"{self.session_name} | Can't check proxy {self.proxy_label}")
 
-    @error_handler
-    async def welcome(self, http_client):
-        sleep = random.randint(1,3)
-        step_1 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"PreStarterSelection"})
-        await asyncio.sleep(sleep)
-        
-        if step_1 == "":
-            step_2 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"StarterSelection"})
-        await asyncio.sleep(sleep)  
-        
-        if step_2 == "":
-            step_3 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/SelectStarter"
-                                       ,json = {"starterOption": "Digby"})
-        await asyncio.sleep(sleep)
-
-        if step_3 == "":
-            step_4 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep": "TappingEgg"})
-        await asyncio.sleep(sleep)  
-
-        if step_4 == "":
-            step_5 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"BeastHatched"})
-        await asyncio.sleep(sleep)  
-
-        if step_5 == "":
-            step_6 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"HelloBeast"})
-        await asyncio.sleep(sleep)  
-
-        if step_6 == "":
-            step_7 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"FeedBeast"})
-        await asyncio.sleep(sleep)  
-
-        if step_7 == "":
-            step_8 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"MoodXpExplanation"})
-        await asyncio.sleep(sleep)  
-
-        if step_8 == "":
-            step_9 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"PreMineShards"})
-        await asyncio.sleep(sleep)  
-
-        if step_9 == "":
-            step_10 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"MineShards"})
-        await asyncio.sleep(sleep)  
-
-        if step_10 == "":
-            step_11 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"FeedBeastAgain"})
-        await asyncio.sleep(sleep)  
-
-        if step_11 == "":
-            step_12 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"FeedBeastMore"})
-        await asyncio.sleep(sleep)  
-
-        if step_12 == "":
-            step_13 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"BeastLevelUp"})
-        await asyncio.sleep(sleep)  
-
-        if step_13 == "":
-            step_14 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"CoinSpendingUpgrades"})
-        await asyncio.sleep(sleep)  
-
-        if step_14 == "":
-            step_15 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"CoinEarningAway"})
-        await asyncio.sleep(sleep)  
-
-        if step_15 == "":
-            step_16 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"MoreLevelMoreCoins"})
-        await asyncio.sleep(sleep)  
-
-        if step_16 == "":
-            step_17 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"BeastHappinessAway"})
-        await asyncio.sleep(sleep)  
-
-        if step_17 == "":
-            step_18 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"BeastHappinessAway2"})
-        await asyncio.sleep(sleep)  
-
-        if step_18 == "":
-            step_19 = await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/UpdateStep"
-                                       ,json = {"newStep":"ThatsAll"})
-        await asyncio.sleep(sleep)  
-
-        if step_19 == "":
-            step_20 =  await self.make_request(http_client, 'POST', endpoint=f"/Onboarding/CompleteOnboarding"
-                                       ,json = {})
-
-        if step_20 == "":
-            return True
-        else: return False
-
-    async def run(self, proxy: str | None) -> None:
-        proxy_conn = ProxyConnector().from_url(proxy) if proxy else None
-
-        http_client = CloudflareScraper(headers=headers, connector=proxy_conn)
+    async def mine(self, http_client, planner: CyclePlanner, chunks: list[int]) -> bool:
+        for mine_amount in chunks:
+            farm_response = await self.perform_farming(http_client=http_client,mine_amount = mine_amount)
+            planner.record('mining', mine_amount, farm_response is not None)
+            if farm_response is None:
+                self.state.mark_dirty()
+                return True
+            self.state.apply_mining(mine_amount, farm_response)
+            self.info(lambda: f"Farming succeeded, mined amount: <cyan>{mine_amount}</cyan>", sample="farming")
+            await self.sleep(planner.pause())
 
+        return self.state.energy > 0
+
+    @error_handler
+    async def welcome(self, http_client, step: str = STEPS[0]):
+        self.info(f"Onboarding from <cyan>{step}</cyan>, <cyan>{remaining_steps(step)}</cyan> step(s) left")
+        while needs_onboarding(step):
+            actions, next_step = TRANSITIONS[step]
+            for endpoint, data in actions:
+                if await self.make_request(http_client, 'POST', endpoint=endpoint, json=data) is None:
+                    self.warning(f"Onboarding stopped at <cyan>{step}</cyan>")
+                    return False
+
+            step = next_step
+            if needs_onboarding(step):
+                await self.sleep(self.rng.randint(1,3))
+
+        return True
+
+    async def onboard(self) -> bool:
+        if not await self.authorize(self.http_client):
+            return False
+
+        onboard_res = await self.get_onboard(http_client=self.http_client)
+        if not onboard_res:
+            return False
+
+        step = onboard_res.get("currentStep", "")
+        if needs_onboarding(step) and not await self.welcome(http_client=self.http_client, step=step):
+            return False
+
+        checkpoint_store.update(self.session_name, onboarded=True)
+        return True
+
+    async def start(self, proxy: str | None) -> None:
+        self.proxy = proxy
+        self.proxy_label = proxy_label(proxy)
+        self.http_client = connection_manager.get_client(proxy=proxy,
+                                                         headers={**headers, 'User-Agent': self.user_agent})
         if proxy:
-            await self.check_proxy(http_client=http_client, proxy=proxy)
-        init_data = None
-        init_data_live_time = random.randint(3300, 3600)
-        init_data_created_time = 0
-        while True:
-            try: 
-                if time() - init_data_created_time >= init_data_live_time or init_data is None:
-                    init_data = await self.get_tg_web_data(proxy=proxy)
-                    init_data_created_time = time()
-                    http_client.headers['authorization'] = f'Bearer {init_data}'
+            await self.check_proxy(proxy=proxy)
 
+    async def close(self) -> None:
+        if self.http_client is None:
+            return
+
+        http_client, self.http_client = self.http_client, None
+        try:
+            await self.save_buffer.drain()
+        finally:
+            await connection_manager.release(self.proxy, http_client)
+            await telegram_pool.release(self.tg_client)
+
+    async def __aenter__(self) -> "Tapper":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def circuit_delay(self) -> int:
+        circuit_open_for = breakers.open_for(api_host(settings.API_BASE_URL))
+        if circuit_open_for <= 0:
+            return 0
+
+        delay = int(circuit_open_for) + self.rng.randint(1, settings.BREAKER_OPEN_TIME)
+        self.warning(f"Kuroro API is unavailable, deferring cycle by <y>{delay}s</y>")
+        return delay
+
+    async def authorize(self, http_client) -> bool:
+        web_data = await web_data_cache.get_or_refresh(self.session_name, self.fetch_tg_web_data)
+        if web_data is None:
+            self.warning("Can't get web app data")
+            return False
+
+        self.user_id = web_data['user_id'] or self.user_id
+        http_client.headers['authorization'] = f"Bearer {web_data['init_data']}"
+        return True
+
+    async def run_cycle(self) -> int | None:
+        http_client = self.http_client
+
+        delay = self.circuit_delay()
+        if delay:
+            return delay
+
+        sleep_time = None
+        self.auth_expired = False
+        try: 
+            if not await self.authorize(http_client):
+                return self.rng.randint(settings.SLEEP_TIME[0], settings.SLEEP_TIME[1])
+
+            checkpoint = checkpoint_store.get(self.session_name)
+            verify = checkpoint.ban_check_due()
+            if verify:
                 ban_res = await self.getBan(http_client=http_client)
                 if ban_res and ban_res.get("status") == "Warning":
                     self.warning(f"<light-yellow>Your Kuroro account may be banned, reason <cyan>{ban_res.get('reason')}</cyan></light-yellow>")
                 elif ban_res and ban_res.get("status") == "Banned":
                     self.critical(f"<red>Your Kuroro account is banned</red>")
-                    break
+                    return None
+                if ban_res is not None:
+                    checkpoint_store.update(self.session_name, ban_checked_at=clock.time())
 
+            # A finished onboarding is only read again together with the ban status
+            if checkpoint.onboarded and not verify:
+                onboard_res = {"currentStep": COMPLETED}
+            else:
                 onboard_res = await self.get_onboard(http_client=http_client)
-                if onboard_res and onboard_res.get("currentStep","") == "WelcomeMessage":
-                    wellcome_res = await self.welcome(http_client=http_client)
-                    if not wellcome_res:
-                        self.warning("<light-yellow>Register Failed, Try again</light-yellow> ")
-                        
-                elif onboard_res:
-                    user_res = await self.get_user(http_client=http_client)
-                    await self.save(http_client=http_client,x = [10,450],y = [10,600])
-                    coins_earn_res = await self.get_coinsearnedaway(http_client=http_client)
-                    await self.update_coins(http_client=http_client)
-                    get_raffle_tickets_res = await self.get_raffle_tickets(http_client)
-
-                    if user_res and coins_earn_res is not None: 
-                        balance = user_res.get("coinsSnapshot",{}).get("value",0)
-                        shards  = user_res.get("shards",0)
-                        beast_lvl = user_res.get("beast",{}).get("level",0)
-                        energy = user_res.get("energySnapshot",{}).get("value",0)
-                        raffle_tickets = get_raffle_tickets_res.get("count",0)
-                        self.info(f"Earn <cyan>{coins_earn_res}</cyan> coins - "
-                                f"Balance: <cyan>{balance}</cyan> - "
-                                f"Shards: <cyan>{shards}</cyan> - "
-                                f"Raffle Tickets: <cyan>{raffle_tickets}</cyan> - "
-                                f"Beast lvl: <cyan>{beast_lvl}</cyan> - "
-                                f"Engery: <cyan>{energy}</cyan>")
-
-                    else: 
-                        self.warning("Cant get user info")
-                        await asyncio.sleep(300,800)
-                        continue
-
-                    if settings.AUTO_REINCARNATE and beast_lvl > settings.REINCARNATE_LVL:
-                        reincarnate_res = await self.reincarnate(http_client=http_client)
-                        if reincarnate_res is not None:
-                            self.info("Reincarnate suceeded")
-
-                    state_response = await self.get_daily_streak_state(http_client = http_client)
-                    if not state_response.get('isTodayClaimed',''):
-
-                        claim_response = await self.claim_daily_bonus(http_client=http_client)
-                        if claim_response:
-                            self.info(f"{claim_response['message']}")
-                        else:
-                            self.info("Reward already claimed today")
-                    else:
-                        self.info("You have received the reward today.")
-
-                    for _ in range(raffle_tickets):
-                        recv_item = await self.use_raffle(http_client=http_client)
-                        if recv_item:
-                            self.info(f"Use raffle ticket successfully, get <cyan>{recv_item}</cyan>")
-                            await asyncio.sleep(random.randint(2,5))
-                            
-                    ball_state_res = await self.get_ball_state(http_client=http_client)
-                    health  = ball_state_res.get('currentHealth',0) + 3
-
-                    if not ball_state_res.get("isDestroyed",True):
-                        for _ in range(random.randint(2, 10)):
-                            hits = random.randint(1,4)
-                            hit_ball_res = await self.hit_ball(http_client=http_client,user_id = self.user_id, hits = hits if hits < health else health)
-                            if hit_ball_res is None:
-                                break
-                            self.info(f"Hitting ball succeeded, number of hits: <cyan>{hits}</cyan>")
-                            await asyncio.sleep(random.randint(2,5))
-
-                    _energy = random.randint(0,energy)
-                    while _energy > 0:
-                        mine_amount = random.randint(*settings.MINE_AMOUNT)
-                        farm_response = await self.perform_farming(http_client=http_client,mine_amount = mine_amount if mine_amount < energy else energy)
-                        if farm_response is not None: 
-                            _energy -= mine_amount 
-                            self.info(f"Farming succeeded, mined amount: <cyan>{mine_amount}</cyan>")
-                        else: 
-                            break
-                        await asyncio.sleep(random.randint(2,5))
+            if onboard_res and needs_onboarding(onboard_res.get("currentStep","")):
+                if checkpoint.onboarded:
+                    checkpoint_store.update(self.session_name, onboarded=False)
+                wellcome_res = await self.welcome(http_client=http_client, step=onboard_res["currentStep"])
+                if not wellcome_res:
+                    self.warning("<light-yellow>Register Failed, Try again</light-yellow> ")
+                    
+            elif onboard_res:
+                if not checkpoint.onboarded:
+                    checkpoint_store.update(self.session_name, onboarded=True)
+                state = self.state or PlayerState()
+                state_sync = state.needs_resync()
+
+                reads = ReadPhase(limit=settings.READ_CONCURRENCY)
+                if state_sync:
+                    reads.add('user', lambda: self.get_user(http_client=http_client))
+                    reads.add('raffle_tickets', lambda: self.get_raffle_tickets(http_client))
+                    reads.add('inventory', lambda: self.get_inventory(http_client=http_client))
+                reads.add('coins_earned', lambda: self.get_coinsearnedaway(http_client=http_client))
+                if not checkpoint.claimed_today:
+                    reads.add('daily_streak', lambda: self.get_daily_streak_state(http_client=http_client))
+                reads.add('ball_state', lambda: self.get_ball_state(http_client=http_client))
+                reads.add('listings', lambda: self.get_listings(http_client=http_client))
+                if settings.AUTO_UPGRADE:
+                    reads.add('upgrades', lambda: self.get_purchasable_upgrades(http_client=http_client))
+                read_res = await reads.run()
+
+                user_res = read_res.get('user')
+                coins_earn_res = read_res['coins_earned']
+
+                await self.save(http_client=http_client,x = [10,450],y = [10,600])
+                await self.update_coins(http_client=http_client)
+
+                if (user_res or not state_sync) and coins_earn_res is not None: 
+                    if state_sync:
+                        state.sync(user_res, read_res['raffle_tickets'], read_res['inventory'])
                     else:
-                        self.info("Out of engery")
-
-                    _shards = random.randint(0,shards)
-                    while _shards > 0:
-                        feed_amount = random.randint(*settings.FEED_AMOUNT)
-                        feed_response = await self.perform_feeding(http_client=http_client,feed_amount = feed_amount if feed_amount < shards else shards)
-                        if feed_response is not None: 
-                                _shards -= feed_amount
-                                self.info(f"Feeding succeeded, feeding amount: <cyan>{feed_amount}</cyan>")
-                        else: 
-                            break
-                        await asyncio.sleep(random.randint(2,5))
+                        state.advance()
+                        state.apply_coins_earned(coins_earn_res)
+                    state.record_earnings(coins_earn_res)
+                    self.state = state
+
+                    balance = state.coins
+                    shards  = state.shards
+                    beast_lvl = state.beast_level
+                    energy = state.energy
+                    raffle_tickets = state.raffle_tickets
+                    self.info(f"Earn <cyan>{coins_earn_res}</cyan> coins - "
+                            f"Balance: <cyan>{balance}</cyan> - "
+                            f"Shards: <cyan>{shards}</cyan> - "
+                            f"Raffle Tickets: <cyan>{raffle_tickets}</cyan> - "
+                            f"Beast lvl: <cyan>{beast_lvl}</cyan> - "
+                            f"Engery: <cyan>{energy}</cyan>")
+
+                else: 
+                    self.warning("Cant get user info")
+                    return self.rng.randint(300, 800)
+
+                if settings.AUTO_REINCARNATE and beast_lvl > settings.REINCARNATE_LVL:
+                    reincarnate_res = await self.reincarnate(http_client=http_client)
+                    if reincarnate_res is not None:
+                        state.mark_dirty()
+                        checkpoint_store.update(self.session_name, reincarnated_at=clock.time())
+                        self.info("Reincarnate suceeded")
+
+                state_response = read_res.get('daily_streak')
+                if checkpoint.claimed_today:
+                    self.info("You have received the reward today.")
+                elif state_response is None or not state_response.is_today_claimed:
+
+                    claim_response = await self.claim_daily_bonus(http_client=http_client)
+                    if claim_response:
+                        state.mark_dirty()
+                        checkpoint_store.update(self.session_name, claimed_on=today())
+                        self.info(f"{claim_response['message']}")
                     else:
-                        self.info("Out of shards")
-
-                    free_money = balance - settings.SAVE_COIN
-                    list_items = await self.get_listings(http_client=http_client)
-                    instock = [ item for item in list_items if item["inStock"] ]
-                    for item in instock:
-                        if free_money > item["coinCost"]:
-                            buy_items_res = await self.buy_item(http_client=http_client,itemId = item['itemId'])
-                            if "successfully" in buy_items_res.get("message",""):
-                                self.info(f"Bought <cyan>{item['name']}</cyan> succeeded!")
-
-                    inventory_items = await self.get_inventory(http_client=http_client)
-                    message = "Inventory: "
-                    dict_items = {}
-                    for item in inventory_items:
-                        dict_items[item['itemId']] = item['quantity']
-                        message += f"{item['itemId'].replace('-',' ').title()}: <cyan>{item['quantity']}</cyan> - "
-                    self.info(message.strip(' - '))
-
-                    if dict_items.get("shards",0) >=1:
-                        await self.use_item(http_client=http_client,itemId = 'shards')
-                    if dict_items.get("energy-drink",0) >=1 and energy <= 0:
-                        use_item_res = await self.use_item(http_client=http_client,itemId = 'energy-drink')
-                        if use_item_res is not None:
-                            self.info("Using Energy Drink")
-                            start_time = time()  
-                            while time() - start_time < 15:  
-                                mine_amount = random.randint(80,100)
-                                farm_response = await self.perform_farming(http_client=http_client,mine_amount = mine_amount)
-
-                    if settings.AUTO_UPGRADE:
-                        upgrades_response = await self.get_purchasable_upgrades(http_client=http_client)
-                        for upgrade in upgrades_response:
-                            if upgrade["canBePurchased"] and upgrade["cost"] < free_money:
-                                buy_response = await self.buy_upgrade(http_client = http_client, upgrade_id = upgrade["upgradeId"])
-                                if buy_response:
-                                    free_money -= upgrade["cost"]
-                                    self.success(f"Successfully bought <cyan>{upgrade['name']}</cyan> for <cyan>{upgrade['cost']}</cyan> coins, earning <cyan>{upgrade['earnIncrement']}</cyan> per hour")
-                                    await asyncio.sleep(random.randint(2,10))
-                                else:
-                                    self.error(f"Failed to buy upgrade {upgrade['name']}")
-
+                        self.info("Reward already claimed today")
                 else:
-                    self.error(f"Failed to tapping! ({onboard_res})")
-
-            except InvalidSession as error:
-                raise error
+                    checkpoint_store.update(self.session_name, claimed_on=today())
+                    self.info("You have received the reward today.")
+
+                for _ in range(raffle_tickets):
+                    recv_item = await self.use_raffle(http_client=http_client)
+                    if recv_item:
+                        state.apply_raffle(recv_item)
+                        self.info(f"Use raffle ticket successfully, get <cyan>{recv_item}</cyan>")
+                        await self.sleep(self.rng.randint(2,5))
+                        
+                planner = CyclePlanner(rng=self.rng)
+                ball_state_res = read_res['ball_state'] or BallState(current_health=0, is_destroyed=True)
+                for hits in planner.hits(ball_state_res.current_health, ball_state_res.is_destroyed):
+                    hit_ball_res = await self.hit_ball(http_client=http_client,user_id = self.user_id, hits = hits)
+                    planner.record('hits', hits, hit_ball_res is not None)
+                    if hit_ball_res is None:
+                        break
+                    self.info(lambda: f"Hitting ball succeeded, number of hits: <cyan>{hits}</cyan>", sample="hit")
+                    await self.sleep(planner.pause())
+
+                if not await self.mine(http_client, planner, planner.mining(state.energy)):
+                    self.info("Out of engery")
+
+                for feed_amount in planner.feeding(state.shards):
+                    feed_response = await self.perform_feeding(http_client=http_client,feed_amount = feed_amount)
+                    planner.record('feeding', feed_amount, feed_response is not None)
+                    if feed_response is None:
+                        state.mark_dirty()
+                        break
+                    state.apply_feeding(feed_amount, feed_response)
+                    self.info(lambda: f"Feeding succeeded, feeding amount: <cyan>{feed_amount}</cyan>", sample="feeding")
+                    await self.sleep(planner.pause())
+                else:
+                    self.info("Out of shards")
+
+                free_money = balance - settings.SAVE_COIN
+                list_items = read_res['listings'] or []
+                instock = [ item for item in list_items if item.in_stock ]
+                for item in instock:
+                    if free_money > item.coin_cost:
+                        buy_items_res = await self.buy_item(http_client=http_client,itemId = item.item_id)
+                        if buy_items_res and "successfully" in buy_items_res.get("message",""):
+                            state.apply_buy_item(item.item_id, item.coin_cost)
+                            self.info(f"Bought <cyan>{item.name}</cyan> succeeded!")
+
+                dict_items = {item_id: quantity for item_id, quantity in state.inventory.items() if quantity > 0}
+                message = "Inventory: "
+                for item_id, quantity in dict_items.items():
+                    message += f"{item_id.replace('-',' ').title()}: <cyan>{quantity}</cyan> - "
+                self.info(message.strip(' - '))
+
+                if dict_items.get("shards",0) >=1:
+                    use_item_res = await self.use_item(http_client=http_client,itemId = 'shards')
+                    if use_item_res is not None:
+                        state.apply_use_item('shards', use_item_res)
+                if dict_items.get("energy-drink",0) >=1 and state.energy <= 0:
+                    use_item_res = await self.use_item(http_client=http_client,itemId = 'energy-drink')
+                    if use_item_res is not None:
+                        state.apply_use_item('energy-drink', use_item_res)
+                        if not (isinstance(use_item_res, dict) and "energySnapshot" in use_item_res):
+                            # The answer doesn't say how much energy the drink gave, read it before mining
+                            state.update_from(await self.get_user(http_client=http_client))
+                        self.info("Using Energy Drink")
+                        await self.mine(http_client, planner,
+                                        planner.mining(state.energy, amount_range=(80, 100), spend_all=True))
+
+                upgrade_gap = 0
+                if settings.AUTO_UPGRADE:
+                    upgrades_response = read_res['upgrades'] or []
+                    for upgrade in upgrades_response:
+                        if upgrade.can_be_purchased and upgrade.cost < free_money:
+                            buy_response = await self.buy_upgrade(http_client = http_client, upgrade_id = upgrade.upgrade_id)
+                            if buy_response:
+                                free_money -= upgrade.cost
+                                state.apply_buy_upgrade(upgrade.cost)
+                                self.success(f"Successfully bought <cyan>{upgrade.name}</cyan> for <cyan>{upgrade.cost}</cyan> coins, earning <cyan>{upgrade.earn_increment}</cyan> per hour")
+                                await self.sleep(self.rng.randint(2,10))
+                            else:
+                                self.error(f"Failed to buy upgrade {upgrade.name}")
+                    upgrade_gap = min((upgrade.cost - free_money for upgrade in upgrades_response
+                                       if upgrade.can_be_purchased and upgrade.cost >= free_money), default=0)
+
+                self.info(planner.summary())
+                sleep_time, reason = next_wake(state, checkpoint.claimed_today, upgrade_gap, rng=self.rng)
+                self.debug(lambda: f"Next wake in <y>{sleep_time}s</y> ({reason})")
 
-            except Exception as error:
-                self.error(f"Unknown error: {error}")
-                await asyncio.sleep(delay=3)
             else:
-                sleep_time = random.randint(settings.SLEEP_TIME[0], settings.SLEEP_TIME[1])
-                self.info(f"Sleep <y>{sleep_time}s</y>")
-                await asyncio.sleep(delay=sleep_time)    
-            
-
-async def run_tapper(tg_client: Client, proxy: str | None):
-    try:
-        await Tapper(tg_client=tg_client).run(proxy=proxy)
-    except InvalidSession:
-        logger.error(f"{tg_client.name} | Invalid Session")
+                self.error(f"Failed to tapping! ({onboard_res})")
+                delay = self.circuit_delay()
+                if delay:
+                    return delay
+
+        except InvalidSession as error:
+            raise error
+
+        except Exception as error:
+            if self.state is not None:
+                self.state.mark_dirty()
+            self.error(f"Unknown error: {error}")
+            return 3
+
+        await self.save_buffer.drain()
+        self.debug(lambda: f"Telemetry: <cyan>{self.save_buffer.calls}</cyan> saves sent as "
+                   f"<cyan>{self.save_buffer.posts}</cyan> posts")
+        return sleep_time or self.rng.randint(settings.SLEEP_TIME[0], settings.SLEEP_TIME[1])
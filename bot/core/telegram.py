@@ -0,0 +1,155 @@
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from time import monotonic
+
+from pyrogram import Client
+
+from bot.config import settings
+from bot.utils import logger
+from bot.utils.metrics import registry
+
+
+TG_CONNECTS = registry.counter('kuroro_telegram_connects_total', 'MTProto connects', ('outcome',))
+TG_CONNECT_SECONDS = registry.histogram('kuroro_telegram_connect_seconds', 'Time spent in Client.connect')
+TG_OPEN = registry.gauge('kuroro_telegram_open_clients', 'Connected Telegram clients kept warm')
+
+
+class TelegramPool:
+    def __init__(self, max_open: int | None = None, idle_timeout: float | None = None):
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        # Connected clients, least recently used first
+        self._open: OrderedDict[str, Client] = OrderedDict()
+        self._last_used: dict[str, float] = {}
+        self._proxies: dict[str, dict | None] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+        self.connects = 0
+        self.connect_failures = 0
+        self.connect_seconds = 0.0
+        self.reuses = 0
+        self.evictions = 0
+
+    @property
+    def limit(self) -> int:
+        return self.max_open or settings.TG_MAX_OPEN_CLIENTS
+
+    @property
+    def timeout(self) -> float:
+        return self.idle_timeout if self.idle_timeout is not None else settings.TG_IDLE_TIMEOUT
+
+    def _lock(self, name: str) -> asyncio.Lock:
+        lock = self._locks.get(name)
+        if lock is None:
+            lock = self._locks[name] = asyncio.Lock()
+
+        return lock
+
+    async def _connect(self, client: Client, proxy: dict | None) -> None:
+        if client.is_connected and self._proxies.get(client.name) != proxy:
+            await self._disconnect(client)
+
+        if client.is_connected:
+            self.reuses += 1
+            return
+
+        client.proxy = proxy
+        started = monotonic()
+        try:
+            await client.connect()
+        except Exception:
+            self.connect_failures += 1
+            TG_CONNECTS.inc('error')
+            raise
+        finally:
+            elapsed = monotonic() - started
+            self.connect_seconds += elapsed
+            TG_CONNECT_SECONDS.observe(elapsed)
+
+        self.connects += 1
+        TG_CONNECTS.inc('ok')
+        self._open[client.name] = client
+        self._proxies[client.name] = proxy
+        TG_OPEN.set(value=len(self._open))
+
+    async def _disconnect(self, client: Client) -> None:
+        self._open.pop(client.name, None)
+        self._last_used.pop(client.name, None)
+        TG_OPEN.set(value=len(self._open))
+        if client.is_connected:
+            try:
+                await client.disconnect()
+            except Exception as error:
+                logger.debug(f"{client.name} | Telegram disconnect failed: {error}")
+
+    async def _evict(self) -> None:
+        # Only clients nobody is using right now can be closed
+        for name in list(self._open):
+            if len(self._open) <= self.limit:
+                return
+            lock = self._lock(name)
+            if lock.locked():
+                continue
+
+            async with lock:
+                client = self._open.get(name)
+                if client is not None:
+                    self.evictions += 1
+                    await self._disconnect(client)
+
+    @asynccontextmanager
+    async def session(self, client: Client, proxy: dict | None = None):
+        async with self._lock(client.name):
+            await self._connect(client, proxy)
+            try:
+                yield client
+            finally:
+                self._last_used[client.name] = monotonic()
+                if client.name in self._open:
+                    self._open.move_to_end(client.name)
+
+        await self._evict()
+
+    async def release(self, client: Client) -> None:
+        async with self._lock(client.name):
+            await self._disconnect(client)
+
+    async def run_reaper(self) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, self.timeout / 2))
+            deadline = monotonic() - self.timeout
+            for name in list(self._open):
+                lock = self._lock(name)
+                if lock.locked() or self._last_used.get(name, 0) > deadline:
+                    continue
+
+                async with lock:
+                    client = self._open.get(name)
+                    if client is not None:
+                        await self._disconnect(client)
+
+    async def close(self) -> None:
+        await asyncio.gather(*(self._disconnect(client) for client in list(self._open.values())),
+                             return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            'tg_open': len(self._open),
+            'tg_connects': self.connects,
+            'tg_connect_failures': self.connect_failures,
+            'tg_connect_avg_s': self.connect_seconds / max(1, self.connects + self.connect_failures),
+            'tg_reuses': self.reuses,
+            'tg_evictions': self.evictions,
+        }
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        logger.info(f"Telegram | Open: <cyan>{stats['tg_open']}</cyan>/<cyan>{self.limit}</cyan> - "
+                    f"Connects: <cyan>{stats['tg_connects']}</cyan> "
+                    f"(avg <cyan>{stats['tg_connect_avg_s']:.2f}s</cyan>) - "
+                    f"Reused: <cyan>{stats['tg_reuses']}</cyan> - "
+                    f"Evicted: <cyan>{stats['tg_evictions']}</cyan>")
+
+
+telegram_pool = TelegramPool()
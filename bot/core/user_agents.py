@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+import sys
+
+from bot.utils import logger
+from .agents import generate_random_user_agent
+
+if sys.platform == 'win32':
+    import msvcrt
+
+    def lock(file) -> None:
+        file.seek(0)
+        while True:
+            # LK_LOCK gives up after ten one second retries, keep waiting like flock does
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def unlock(file) -> None:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def lock(file) -> None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+
+    def unlock(file) -> None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+class UserAgentStore:
+    def __init__(self, file_name: str = "user_agents.json"):
+        self.file_name = file_name
+        self._index: dict[str, str] | None = None
+        self._dirty = False
+        self._flush_handle: asyncio.Handle | None = None
+
+    def _read_file(self) -> dict[str, str]:
+        try:
+            with open(self.file_name, 'r') as user_agents:
+                session_data = json.load(user_agents)
+                if isinstance(session_data, list):
+                    return {session['session_name']: session['user_agent'] for session in session_data}
+
+        except FileNotFoundError:
+            logger.warning("User agents file not found, creating...")
+
+        except (json.JSONDecodeError, KeyError, TypeError):
+            logger.warning("User agents file is empty or corrupted.")
+
+        return {}
+
+    @property
+    def index(self) -> dict[str, str]:
+        if self._index is None:
+            self._index = self._read_file()
+
+        return self._index
+
+    def get(self, session_name: str) -> str:
+        user_agent = self.index.get(session_name)
+        if user_agent is None:
+            user_agent = self.index[session_name] = generate_random_user_agent()
+            self._schedule_flush()
+            logger.success(f"<light-yellow>{session_name}</light-yellow> | User agent saved successfully")
+
+        return user_agent
+
+    def _schedule_flush(self) -> None:
+        self._dirty = True
+        if self._flush_handle is not None:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+
+        # New sessions usually show up in bulk at startup, so write them in one go
+        self._flush_handle = loop.call_later(1, self._flush_in_background)
+
+    def _flush_in_background(self) -> None:
+        self._flush_handle = None
+        if not self._dirty:
+            return
+
+        # Waiting for another worker's lock must not stall the event loop
+        self._dirty = False
+        task = asyncio.get_running_loop().create_task(asyncio.to_thread(self._write, dict(self.index)))
+        task.add_done_callback(self._written)
+
+    def _written(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"User agents | Can't write <cyan>{self.file_name}</cyan>: {task.exception()}")
+            self._dirty = True
+
+    def _write(self, index: dict[str, str]) -> None:
+        # Worker processes share the file, so the read, merge and replace must not interleave. The OS drops the lock
+        # of a process that dies, so there is nothing stale to take over
+        with open(f"{self.file_name}.lock", 'a') as lock_file:
+            lock(lock_file)
+            try:
+                # Keep entries written by other worker processes since we loaded the file
+                merged = {**self._read_file(), **index} if os.path.exists(self.file_name) else index
+                session_data = [{'session_name': name, 'user_agent': user_agent} for name, user_agent in merged.items()]
+
+                tmp_file_name = f"{self.file_name}.{os.getpid()}.tmp"
+                with open(tmp_file_name, 'w') as user_agents:
+                    json.dump(session_data, user_agents, indent=4)
+                os.replace(tmp_file_name, self.file_name)
+            finally:
+                unlock(lock_file)
+
+    def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if not self._dirty:
+            return
+
+        self._write(dict(self.index))
+        self._dirty = False
+
+
+user_agent_store = UserAgentStore()
@@ -0,0 +1,44 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from bot.config import settings
+from .clock import clock
+from .state import PlayerState
+
+
+def seconds_until_reset(now: datetime | None = None) -> float:
+    now = now or clock.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    return (midnight - now).total_seconds()
+
+
+def next_wake(state: PlayerState, claimed_today: bool, upgrade_gap: float = 0,
+              rng: random.Random | None = None) -> tuple[int, str]:
+    rng = rng or random
+    if not settings.ADAPTIVE_WAKE:
+        return rng.randint(*settings.SLEEP_TIME), 'fixed'
+
+    # Each candidate is the earliest moment a cycle has something worth doing. The ball is hit on whatever
+    # wake-up energy brings, it never costs a cycle of its own
+    candidates = {}
+    if state.energy_regen > 0 and state.max_energy:
+        # Enough energy for a full mining run, or full already so that waiting longer would waste regen
+        energy = state.projected_energy()
+        gain = state.max_energy * settings.WAKE_ENERGY_RATIO / state.energy_regen
+        full = max(0.0, state.max_energy - energy) / state.energy_regen
+        candidates['energy'] = min(gain, full)
+    if upgrade_gap > 0 and state.coin_rate > 0:
+        candidates['upgrade'] = upgrade_gap / state.coin_rate
+    if claimed_today:
+        candidates['daily reset'] = seconds_until_reset() + rng.randint(30, 300)
+
+    # Without a regeneration rate the other candidates could sleep through hours of energy, so keep the old
+    # behaviour until the next sync tells us more
+    if 'energy' not in candidates:
+        return rng.randint(*settings.SLEEP_TIME), 'no regen data'
+
+    reason = min(candidates, key=candidates.get)
+    low, high = settings.WAKE_BOUNDS
+    delay = min(max(candidates[reason], low), high)
+    delay *= 1 + rng.uniform(-settings.WAKE_JITTER, settings.WAKE_JITTER)
+    return int(min(max(delay, low), high)), reason
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+from time import time
+from typing import Awaitable, Callable
+from urllib.parse import parse_qs
+
+from bot.config import settings
+from bot.utils import logger
+
+
+def parse_web_data(init_data: str) -> tuple[int, int]:
+    query = parse_qs(init_data)
+    auth_date = int(query.get('auth_date', ['0'])[0] or 0)
+    try:
+        user_id = int(json.loads(query.get('user', ['{}'])[0]).get('id', 0))
+    except (ValueError, AttributeError):
+        user_id = 0
+
+    return auth_date, user_id
+
+
+class WebDataCache:
+    def __init__(self, workdir: str = "sessions/"):
+        self.workdir = workdir
+        self._entries: dict[str, dict] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+        self.hits = 0
+        self.refreshes = 0
+
+    def _path(self, session_name: str) -> str:
+        return os.path.join(self.workdir, f"{session_name}.webdata.json")
+
+    def _load(self, session_name: str) -> dict | None:
+        if session_name in self._entries:
+            return self._entries[session_name]
+
+        try:
+            with open(self._path(session_name), 'r') as file:
+                entry = json.load(file)
+        except FileNotFoundError:
+            entry = None
+        except (json.JSONDecodeError, OSError):
+            logger.warning(f"{session_name} | Web data cache is corrupted, refreshing")
+            entry = None
+
+        if entry is not None and not entry.get('init_data'):
+            entry = None
+
+        self._entries[session_name] = entry
+        return entry
+
+    def _store(self, session_name: str, init_data: str) -> dict:
+        auth_date, user_id = parse_web_data(init_data)
+        entry = {
+            'init_data': init_data,
+            'auth_date': auth_date or int(time()),
+            'user_id': user_id,
+        }
+        self._entries[session_name] = entry
+
+        path = self._path(session_name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(entry, file)
+        os.replace(tmp_path, path)
+
+        return entry
+
+    def is_fresh(self, entry: dict | None) -> bool:
+        if not entry:
+            return False
+
+        expires_at = entry['auth_date'] + settings.WEB_DATA_LIFETIME
+        return time() < expires_at - settings.WEB_DATA_REFRESH_MARGIN
+
+    def get(self, session_name: str) -> dict | None:
+        entry = self._load(session_name)
+        return entry if self.is_fresh(entry) else None
+
+    def invalidate(self, session_name: str, init_data: str | None = None) -> None:
+        # A late rejection of the previous web app data must not throw away the one that replaced it
+        entry = self._load(session_name)
+        if init_data is not None and entry is not None and entry['init_data'] != init_data:
+            return
+
+        self._entries[session_name] = None
+        try:
+            os.remove(self._path(session_name))
+        except FileNotFoundError:
+            pass
+
+    async def get_or_refresh(self, session_name: str, fetch: Callable[[], Awaitable[str | None]]) -> dict | None:
+        entry = self.get(session_name)
+        if entry:
+            self.hits += 1
+            return entry
+
+        lock = self._locks.setdefault(session_name, asyncio.Lock())
+        async with lock:
+            # Another caller may have refreshed while we were waiting for the lock
+            entry = self.get(session_name)
+            if entry:
+                self.hits += 1
+                return entry
+
+            init_data = await fetch()
+            if not init_data:
+                return None
+
+            self.refreshes += 1
+            return self._store(session_name, init_data)
+
+
+web_data_cache = WebDataCache()
@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+from time import monotonic, process_time, time
+from urllib.parse import quote
+
+import aiohttp
+
+from bot.utils import logger
+from bot.config import settings
+from bot.core.tapper import Tapper
+from bot.core.connection import connection_manager
+from bot.core.web_data import web_data_cache
+from bot.core.user_agents import user_agent_store
+from bot.core.checkpoints import checkpoint_store
+from bot.core.scheduler import percentile
+from bot.core.cassette import cassette
+from bot.core.clock import clock
+from .server import serve
+
+
+class SimulatedClient:
+    def __init__(self, name: str, user_id: int):
+        self.name = name
+        self.user_id = user_id
+        self.is_connected = False
+        self.proxy = None
+
+
+class SimulatedTapper(Tapper):
+    async def get_tg_web_data(self, proxy: str | None) -> str:
+        user = quote(json.dumps({"id": self.tg_client.user_id, "first_name": self.session_name}))
+        return f"query_id=bench&user={user}&auth_date={int(time())}&hash=bench"
+
+    async def start(self, proxy: str | None) -> None:
+        await super().start(proxy=proxy)
+        # Every simulated session goes out through the same pretend proxy, so --rate-limit has a bucket to share
+        self.proxy_label = 'bench'
+
+
+def rss_mb() -> float:
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def start_server(**options) -> tuple[multiprocessing.Process, str]:
+    context = multiprocessing.get_context("spawn")
+    port_queue = context.Queue()
+    process = context.Process(target=serve, kwargs=dict(port_queue=port_queue, **options), daemon=True)
+    process.start()
+    port = port_queue.get(timeout=30)
+
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def fetch_server_stats(server_url: str) -> dict:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{server_url}/__stats") as response:
+            return await response.json()
+
+
+async def run_benchmark(server_url: str, sessions: int, cycles: int, concurrency: int) -> dict:
+    settings.API_BASE_URL = f"{server_url}/api"
+    workdir = tempfile.mkdtemp(prefix="kuroro-bench-")
+    web_data_cache.workdir = workdir
+    user_agent_store.file_name = os.path.join(workdir, "user_agents.json")
+    checkpoint_store.file_name = os.path.join(workdir, "checkpoints.sqlite3")
+
+    tappers = [SimulatedTapper(tg_client=SimulatedClient(f"bench-{index}", 100_000 + index))
+               for index in range(sessions)]
+    for tapper in tappers:
+        await tapper.start(proxy=None)
+
+    before = await fetch_server_stats(server_url)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def run_session(tapper: Tapper) -> None:
+        for _ in range(cycles):
+            async with semaphore:
+                started = monotonic()
+                if await tapper.run_cycle() is None:
+                    return
+                latencies.append(monotonic() - started)
+
+    rss_before = rss_mb()
+    cpu_started, wall_started = process_time(), monotonic()
+    try:
+        await asyncio.gather(*(run_session(tapper) for tapper in tappers))
+    finally:
+        cpu, wall = process_time() - cpu_started, monotonic() - wall_started
+        await asyncio.gather(*(tapper.close() for tapper in tappers))
+        pool_stats = connection_manager.stats()
+        await connection_manager.close()
+        user_agent_store.flush()
+        checkpoint_store.close()
+
+    server_stats = await fetch_server_stats(server_url)
+    requests = sum(server_stats['requests'].values()) - sum(before['requests'].values())
+
+    return {
+        'sessions': sessions,
+        'cycles': len(latencies),
+        'wall_s': wall,
+        'requests': requests,
+        'errors': sum(server_stats['errors'].values()) - sum(before['errors'].values()),
+        'requests_per_s': requests / wall if wall else 0,
+        'cycle_p50_s': percentile(latencies, 0.5),
+        'cycle_p90_s': percentile(latencies, 0.9),
+        'cycle_p99_s': percentile(latencies, 0.99),
+        'cpu_s': cpu,
+        'cpu_ms_per_session': cpu / sessions * 1000 if sessions else 0,
+        'rss_mb': rss_mb(),
+        'rss_growth_mb': rss_mb() - rss_before,
+        'connections_created': pool_stats['connections_created'],
+        'connections_reused': pool_stats['connections_reused'],
+    }
+
+
+async def advance_clock(server_url: str, seconds: float) -> None:
+    clock.advance(seconds)
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{server_url}/__clock", json={"advance": seconds}) as response:
+            response.raise_for_status()
+
+
+async def run_simulation(server_url: str, sessions: int, hours: float, concurrency: int) -> dict:
+    settings.API_BASE_URL = f"{server_url}/api"
+    workdir = tempfile.mkdtemp(prefix="kuroro-sim-")
+    web_data_cache.workdir = workdir
+    user_agent_store.file_name = os.path.join(workdir, "user_agents.json")
+    checkpoint_store.file_name = os.path.join(workdir, "checkpoints.sqlite3")
+
+    tappers = [SimulatedTapper(tg_client=SimulatedClient(f"sim-{index}", 300_000 + index))
+               for index in range(sessions)]
+    for tapper in tappers:
+        await tapper.start(proxy=None)
+
+    before = await fetch_server_stats(server_url)
+    semaphore = asyncio.Semaphore(concurrency)
+    started = clock.time()
+    end = started + hours * 3600
+    due = {tapper: started for tapper in tappers}
+    cycles = 0
+
+    async def run_session(tapper: Tapper) -> None:
+        nonlocal cycles
+        async with semaphore:
+            sleep_time = await tapper.run_cycle()
+        cycles += 1
+        if sleep_time is None:
+            del due[tapper]
+        else:
+            due[tapper] = clock.time() + sleep_time
+
+    # Sleeps are skipped on the game clock of both sides, every session wakes exactly when it asked to
+    wall_started = monotonic()
+    try:
+        while due:
+            next_due = min(due.values())
+            if next_due >= end:
+                break
+            if next_due > clock.time():
+                await advance_clock(server_url, next_due - clock.time())
+            now = clock.time()
+            await asyncio.gather(*(run_session(tapper) for tapper, at in list(due.items()) if at <= now))
+    finally:
+        wall = monotonic() - wall_started
+        await asyncio.gather(*(tapper.close() for tapper in tappers))
+        await connection_manager.close()
+        user_agent_store.flush()
+        checkpoint_store.close()
+
+    after = await fetch_server_stats(server_url)
+    requests = sum(count - before['requests'].get(endpoint, 0) for endpoint, count in after['requests'].items()
+                   if endpoint.startswith('/api'))
+    rewards = {key: value - before['rewards'].get(key, 0) for key, value in after['rewards'].items()}
+    reward = rewards.get('mined', 0) + rewards.get('fed', 0) + rewards.get('hits', 0)
+
+    return {
+        'sessions': sessions,
+        'simulated_h': hours,
+        'adaptive_wake': settings.ADAPTIVE_WAKE,
+        'cycles': cycles,
+        'cycles_per_session_h': cycles / sessions / hours if sessions and hours else 0,
+        'requests': requests,
+        'errors': sum(after['errors'].values()) - sum(before['errors'].values()),
+        'rewards': rewards,
+        'requests_per_reward': requests / reward if reward else 0,
+        'requests_per_1k_coins': requests / rewards['coins'] * 1000 if rewards.get('coins') else 0,
+        'wall_s': wall,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run simulated sessions through Tapper against the mock API")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=100, help="Cycles running at the same time")
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.05, 0.2), metavar=('MIN', 'MAX'))
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--onboarded-ratio", type=float, default=1.0)
+    parser.add_argument("--delay-scale", type=float, default=0.0, help="Scale of the in-cycle pauses")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Requests/s per proxy, all simulated sessions share one (0 disables)")
+    parser.add_argument("--server-url", help="Use an already running mock server instead of spawning one")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--record", help="Also capture the traffic to this cassette, for bot.mock.replay")
+    parser.add_argument("--simulate", type=float, metavar='HOURS',
+                        help="Run every session on its own schedule for this many hours of game time instead of "
+                             "back to back cycles, and report requests per unit of reward")
+    parser.add_argument("--fixed-sleep", action='store_true', help="Sleep SLEEP_TIME between cycles (ADAPTIVE_WAKE off)")
+    args = parser.parse_args()
+
+    settings.DELAY_SCALE = args.delay_scale
+    settings.RATE_LIMIT_PER_PROXY = args.rate_limit
+    settings.ADAPTIVE_WAKE = not args.fixed_sleep
+    logger.remove()
+    if args.record:
+        cassette.record(args.record, seed=args.seed)
+
+    server = None
+    server_url = args.server_url
+    if server_url is None:
+        server, server_url = start_server(latency=tuple(args.latency), error_rate=args.error_rate,
+                                          seed=args.seed, onboarded_ratio=args.onboarded_ratio)
+    try:
+        if args.simulate:
+            results = asyncio.run(run_simulation(server_url=server_url, sessions=args.sessions,
+                                                 hours=args.simulate, concurrency=args.concurrency))
+        else:
+            results = asyncio.run(run_benchmark(server_url=server_url, sessions=args.sessions,
+                                                cycles=args.cycles, concurrency=args.concurrency))
+    finally:
+        if server is not None:
+            server.terminate()
+
+    cassette.save()
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=4)
+
+
+if __name__ == '__main__':
+    main()
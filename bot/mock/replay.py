@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import tracemalloc
+from time import monotonic, process_time
+
+from bot.utils import logger
+from bot.config import settings
+from bot.core.tapper import Tapper
+from bot.core.cassette import cassette
+from bot.core.connection import connection_manager
+from bot.core.web_data import web_data_cache
+from bot.core.user_agents import user_agent_store
+from bot.core.checkpoints import checkpoint_store
+from .bench import SimulatedClient
+
+
+async def run_replay(cycles: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="kuroro-replay-")
+    web_data_cache.workdir = workdir
+    user_agent_store.file_name = os.path.join(workdir, "user_agents.json")
+    checkpoint_store.file_name = os.path.join(workdir, "checkpoints.sqlite3")
+
+    tappers = [Tapper(tg_client=SimulatedClient(session_name, 0)) for session_name in cassette.sessions()]
+    for tapper in tappers:
+        await tapper.start(proxy=None)
+
+    async def run_session(tapper: Tapper) -> int:
+        done = 0
+        for _ in range(cycles):
+            done += 1
+            if await tapper.run_cycle() is None:
+                break
+        return done
+
+    tracemalloc.start()
+    cpu_started, wall_started = process_time(), monotonic()
+    try:
+        done = await asyncio.gather(*(run_session(tapper) for tapper in tappers))
+    finally:
+        cpu, wall = process_time() - cpu_started, monotonic() - wall_started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await asyncio.gather(*(tapper.close() for tapper in tappers))
+        await connection_manager.close()
+        checkpoint_store.close()
+
+    return {
+        'sessions': len(tappers),
+        'cycles': sum(done),
+        'served': cassette.served,
+        'misses': cassette.misses,
+        'wall_s': wall,
+        'cpu_s': cpu,
+        'cpu_ms_per_cycle': cpu / sum(done) * 1000 if sum(done) else 0,
+        'peak_alloc_mb': peak / 1024 / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run Tapper cycles against a recorded cassette, without network")
+    parser.add_argument("cassette", help="File written with CASSETTE_RECORD or bench --record")
+    parser.add_argument("--cycles", type=int, default=1, help="Cycles per recorded session")
+    parser.add_argument("--time-scale", type=float, default=0.0,
+                        help="1 replays at recorded latency, 0 answers immediately")
+    parser.add_argument("--delay-scale", type=float, default=0.0, help="Scale of the in-cycle pauses")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    settings.DELAY_SCALE = args.delay_scale
+    settings.RATE_LIMIT_PER_PROXY = 0
+    logger.remove()
+
+    cassette.replay(args.cassette, time_scale=args.time_scale)
+    results = asyncio.run(run_replay(cycles=args.cycles))
+
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=4)
+
+
+if __name__ == '__main__':
+    main()
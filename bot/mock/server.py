@@ -0,0 +1,391 @@
+import argparse
+import asyncio
+import random
+from collections import Counter
+from datetime import datetime, timezone
+from time import time
+
+from aiohttp import web
+
+from bot.utils import logger
+from bot.core.web_data import parse_web_data
+
+
+ONBOARDING_DONE = "Completed"
+
+LISTINGS = [
+    {"itemId": "energy-drink", "name": "Energy Drink", "coinCost": 5_000, "inStock": True},
+    {"itemId": "shards", "name": "Shards Pack", "coinCost": 20_000, "inStock": True},
+    {"itemId": "golden-egg", "name": "Golden Egg", "coinCost": 1_000_000, "inStock": False},
+]
+
+UPGRADES = [
+    {"upgradeId": f"upgrade-{index}", "name": f"Upgrade {index}", "cost": 10_000 * index, "earnIncrement": 50 * index}
+    for index in range(1, 9)
+]
+
+ENERGY_REGEN = 500 / 1800
+BALL_RESPAWN = 3600
+BALL_HEALTH = (20, 40)
+BASE_EARN_PER_HOUR = 3600
+EARN_AWAY_CAP = 3 * 3600
+
+
+class Player:
+    def __init__(self, user_id: int, rng: random.Random, onboarded: bool, now: float):
+        self.user_id = user_id
+        self.coins = rng.randint(0, 2_000_000)
+        self.shards = rng.randint(0, 300)
+        self.energy = float(rng.randint(0, 500))
+        self.max_energy = 500
+        self.beast_level = rng.randint(1, 80)
+        self.raffle_tickets = rng.randint(0, 3)
+        self.inventory = Counter({"energy-drink": rng.randint(0, 1)})
+        self.claimed_on = None
+        self.ball_health = rng.randint(0, 40)
+        self.ball_destroyed_at = now if self.ball_health <= 0 else None
+        self.onboarding_step = ONBOARDING_DONE if onboarded else "WelcomeMessage"
+        self.upgrades = set()
+        self.earned_at = now
+        self.ticked_at = now
+        # Per endpoint request counts, every request draws from its own seeded rng
+        self.requests = Counter()
+        self.rewards = Counter()
+
+    def tick(self, now: float, rng: random.Random) -> None:
+        elapsed = max(0.0, now - self.ticked_at)
+        self.ticked_at = now
+        self.energy = min(self.max_energy, self.energy + elapsed * ENERGY_REGEN)
+        if self.ball_destroyed_at is not None and now - self.ball_destroyed_at >= BALL_RESPAWN:
+            self.ball_health = rng.randint(*BALL_HEALTH)
+            self.ball_destroyed_at = None
+
+    def earn_rate(self) -> float:
+        increments = sum(upgrade["earnIncrement"] for upgrade in UPGRADES if upgrade["upgradeId"] in self.upgrades)
+        return (BASE_EARN_PER_HOUR + increments) / 3600
+
+    def player_state(self) -> dict:
+        return {
+            "coinsSnapshot": {"value": self.coins},
+            "energySnapshot": {"value": int(self.energy), "maxValue": self.max_energy},
+            "shards": self.shards,
+            "beast": {"level": self.beast_level},
+        }
+
+
+class MockKuroroServer:
+    def __init__(self, latency: tuple[float, float] = (0.0, 0.0), error_rate: float = 0.0, seed: int = 0,
+                 onboarded_ratio: float = 1.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.onboarded_ratio = onboarded_ratio
+        self.players: dict[int, Player] = {}
+        # Game time runs with the wall clock plus whatever the bench skipped ahead through /__clock
+        self.clock_offset = 0.0
+        self.requests = Counter()
+        self.errors = Counter()
+
+        self.app = web.Application(middlewares=[self.middleware])
+        self.app.router.add_get('/__stats', self.stats)
+        self.app.router.add_post('/__clock', self.advance_clock)
+        self.app.router.add_get('/ip', self.ip)
+
+        routes = {
+            ('GET', '/Bans/GetBanState'): self.get_ban_state,
+            ('GET', '/Onboarding/GetOnboardingState'): self.get_onboarding_state,
+            ('POST', '/Onboarding/UpdateStep'): self.update_step,
+            ('POST', '/Onboarding/SelectStarter'): self.empty,
+            ('POST', '/Onboarding/CompleteOnboarding'): self.complete_onboarding,
+            ('GET', '/Game/GetPlayerState'): self.get_player_state,
+            ('GET', '/Game/CoinsEarnedAway'): self.coins_earned_away,
+            ('POST', '/Game/UpdateCoinsSnapshot'): self.empty,
+            ('GET', '/RaffleTickets/GetRaffleTickets'): self.get_raffle_tickets,
+            ('POST', '/RaffleTickets/UseRaffleTicket'): self.use_raffle_ticket,
+            ('GET', '/DailyStreak/GetState'): self.get_daily_streak,
+            ('POST', '/DailyStreak/ClaimDailyBonus'): self.claim_daily_bonus,
+            ('GET', '/EnergyBalls/GetEnergyBallState'): self.get_ball_state,
+            ('POST', '/EnergyBalls/TakeHitsCombo/{ball}'): self.take_hits,
+            ('POST', '/Clicks/MiningAndFeeding'): self.mining_and_feeding,
+            ('GET', '/CoinsShop/GetListings'): self.get_listings,
+            ('POST', '/CoinsShop/BuyItem'): self.buy_item,
+            ('GET', '/Inventory/GetInventory'): self.get_inventory,
+            ('POST', '/Inventory/UseItem'): self.use_item,
+            ('GET', '/Upgrades/GetPurchasableUpgrades'): self.get_upgrades,
+            ('POST', '/Upgrades/BuyUpgrade'): self.buy_upgrade,
+            ('GET', '/Quests/GetActiveQuests'): self.get_quests,
+            ('POST', '/Reincarnate/Reincarnate'): self.reincarnate,
+            ('POST', '/Bf/Save'): self.empty,
+        }
+        for (method, path), handler in routes.items():
+            self.app.router.add_route(method, f'/api{path}', handler)
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        resource = request.match_info.route.resource
+        endpoint = resource.canonical if resource is not None else request.path
+        self.requests[endpoint] += 1
+
+        if endpoint.startswith('/api'):
+            rng = self.rng(request) if self._authorized(request) else random.Random(self.seed)
+            if self.latency[1] > 0:
+                await asyncio.sleep(rng.uniform(*self.latency))
+
+            if not self._authorized(request):
+                self.errors[endpoint] += 1
+                raise web.HTTPUnauthorized()
+
+            if self.error_rate and rng.random() < self.error_rate:
+                self.errors[endpoint] += 1
+                if rng.random() < 0.3:
+                    raise web.HTTPTooManyRequests(headers={'Retry-After': '1'})
+                raise web.HTTPServiceUnavailable()
+
+        return await handler(request)
+
+    @staticmethod
+    def _token(request: web.Request) -> str:
+        return request.headers.get('Authorization', '').removeprefix('Bearer ')
+
+    def _authorized(self, request: web.Request) -> bool:
+        return parse_web_data(self._token(request))[1] != 0
+
+    def now(self) -> float:
+        return time() + self.clock_offset
+
+    def player(self, request: web.Request) -> Player:
+        user_id = parse_web_data(self._token(request))[1]
+        player = self.players.get(user_id)
+        if player is None:
+            rng = random.Random(self.seed * 1_000_003 + user_id)
+            player = self.players[user_id] = Player(user_id, rng, onboarded=rng.random() < self.onboarded_ratio,
+                                                    now=self.now())
+
+        if not request.get('ticked'):
+            request['ticked'] = True
+            player.tick(self.now(), self.rng(request))
+        return player
+
+    def rng(self, request: web.Request) -> random.Random:
+        # Seeded by (player, endpoint, how many times the player called it), so concurrent requests of one
+        # player get the same draws whatever order they arrive in
+        rng = request.get('rng')
+        if rng is None:
+            player = self.player(request)
+            key = f"{request.method} {request.match_info.route.resource.canonical}"
+            player.requests[key] += 1
+            rng = request['rng'] = random.Random(f"{self.seed}:{player.user_id}:{key}:{player.requests[key]}")
+
+        return rng
+
+    def today(self) -> str:
+        return datetime.fromtimestamp(self.now(), timezone.utc).date().isoformat()
+
+    async def advance_clock(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        self.clock_offset += float(data.get("advance", 0))
+        return web.json_response({"now": self.now()})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        rewards = Counter()
+        for player in self.players.values():
+            rewards.update(player.rewards)
+        return web.json_response({
+            'requests': dict(self.requests),
+            'errors': dict(self.errors),
+            'players': len(self.players),
+            'rewards': dict(rewards),
+        })
+
+    async def ip(self, request: web.Request) -> web.Response:
+        return web.json_response({'origin': request.remote})
+
+    async def empty(self, request: web.Request) -> web.Response:
+        return web.Response(text="")
+
+    async def get_ban_state(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "None"})
+
+    async def get_onboarding_state(self, request: web.Request) -> web.Response:
+        return web.json_response({"currentStep": self.player(request).onboarding_step})
+
+    async def update_step(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        self.player(request).onboarding_step = data.get("newStep", "")
+        return web.Response(text="")
+
+    async def complete_onboarding(self, request: web.Request) -> web.Response:
+        self.player(request).onboarding_step = ONBOARDING_DONE
+        return web.Response(text="")
+
+    async def get_player_state(self, request: web.Request) -> web.Response:
+        return web.json_response(self.player(request).player_state())
+
+    async def coins_earned_away(self, request: web.Request) -> web.Response:
+        player = self.player(request)
+        now = self.now()
+        earned = int(min(now - player.earned_at, EARN_AWAY_CAP) * player.earn_rate())
+        player.earned_at = now
+        player.coins += earned
+        player.rewards['coins'] += earned
+        return web.json_response(earned)
+
+    async def get_raffle_tickets(self, request: web.Request) -> web.Response:
+        return web.json_response({"count": self.player(request).raffle_tickets})
+
+    async def use_raffle_ticket(self, request: web.Request) -> web.Response:
+        player = self.player(request)
+        if player.raffle_tickets <= 0:
+            raise web.HTTPBadRequest(text="No raffle tickets")
+
+        player.raffle_tickets -= 1
+        item = self.rng(request).choice(["energy-drink", "shards"])
+        player.inventory[item] += 1
+        return web.json_response({"itemId": item, "quantity": 1})
+
+    async def get_daily_streak(self, request: web.Request) -> web.Response:
+        return web.json_response({"isTodayClaimed": self.player(request).claimed_on == self.today()})
+
+    async def claim_daily_bonus(self, request: web.Request) -> web.Response:
+        player = self.player(request)
+        today = self.today()
+        if player.claimed_on == today:
+            raise web.HTTPBadRequest(text="Already claimed")
+
+        player.claimed_on = today
+        player.coins += 1_000
+        return web.json_response({"message": "Daily bonus claimed successfully"})
+
+    async def get_ball_state(self, request: web.Request) -> web.Response:
+        player = self.player(request)
+        return web.json_response({"currentHealth": player.ball_health, "isDestroyed": player.ball_health <= 0})
+
+    async def take_hits(self, request: web.Request) -> web.Response:
+        player = self.player(request)
+        data = await request.json()
+        hits = min(player.ball_health, int(data.get("hits", 0)))
+        player.ball_health -= hits
+        player.rewards['hits'] += hits
+        if hits and player.ball_health <= 0:
+            player.ball_destroyed_at = self.now()
+        return web.json_response({"currentHealth": player.ball_health, "isDestroyed": player.ball_health <= 0})
+
+    async def mining_and_feeding(self, request: web.Request) -> web.Response:
+        player = self.player(request)
+        data = await request.json()
+        mine_amount = int(data.get("mineAmount", 0))
+        feed_amount = int(data.get("feedAmount", 0))
+        if mine_amount > player.energy or feed_amount > player.shards:
+            raise web.HTTPBadRequest(text="Not enough resources")
+
+        player.energy -= mine_amount
+        player.shards += mine_amount - feed_amount
+        player.rewards['mined'] += mine_amount
+        player.rewards['fed'] += feed_amount
+        if feed_amount:
+            player.beast_level += feed_amount // 100
+        return web.json_response(player.player_state())
+
+    async def get_listings(self, request: web.Request) -> web.Response:
+        return web.json_response(LISTINGS)
+
+    async def buy_item(self, request: web.Request) -> web.Response:
+        player = self.player(request)
+        data = await request.json()
+        item = next((item for item in LISTINGS if item["itemId"] == data.get("itemId")), None)
+        if item is None or not item["inStock"] or item["coinCost"] > player.coins:
+            raise web.HTTPBadRequest(text="Cannot buy item")
+
+        player.coins -= item["coinCost"]
+        player.inventory[item["itemId"]] += 1
+        return web.json_response({"message": "Item bought successfully"})
+
+    async def get_inventory(self, request: web.Request) -> web.Response:
+        player = self.player(request)
+        return web.json_response([
+            {"itemId": item_id, "quantity": quantity}
+            for item_id, quantity in player.inventory.items() if quantity > 0
+        ])
+
+    async def use_item(self, request: web.Request) -> web.Response:
+        player = self.player(request)
+        data = await request.json()
+        item_id = data.get("itemId")
+        if player.inventory[item_id] <= 0:
+            raise web.HTTPBadRequest(text="Item not in inventory")
+
+        player.inventory[item_id] -= 1
+        if item_id == "energy-drink":
+            player.energy = player.max_energy
+        elif item_id == "shards":
+            player.shards += 100
+        return web.json_response(player.player_state())
+
+    async def get_upgrades(self, request: web.Request) -> web.Response:
+        player = self.player(request)
+        return web.json_response([
+            {**upgrade, "canBePurchased": upgrade["upgradeId"] not in player.upgrades}
+            for upgrade in UPGRADES
+        ])
+
+    async def buy_upgrade(self, request: web.Request) -> web.Response:
+        player = self.player(request)
+        data = await request.json()
+        upgrade = next((upgrade for upgrade in UPGRADES if upgrade["upgradeId"] == data.get("upgradeId")), None)
+        if upgrade is None or upgrade["upgradeId"] in player.upgrades or upgrade["cost"] > player.coins:
+            raise web.HTTPBadRequest(text="Cannot buy upgrade")
+
+        player.coins -= upgrade["cost"]
+        player.upgrades.add(upgrade["upgradeId"])
+        return web.json_response({"upgradeId": upgrade["upgradeId"]})
+
+    async def get_quests(self, request: web.Request) -> web.Response:
+        return web.json_response([])
+
+    async def reincarnate(self, request: web.Request) -> web.Response:
+        player = self.player(request)
+        player.beast_level = 1
+        return web.json_response({})
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> tuple[web.AppRunner, int]:
+        runner = web.AppRunner(self.app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        return runner, port
+
+
+def serve(port_queue=None, host: str = '127.0.0.1', port: int = 0, **options) -> None:
+    async def main():
+        server = MockKuroroServer(**options)
+        runner, bound_port = await server.start(host=host, port=port)
+        if port_queue is not None:
+            port_queue.put(bound_port)
+        else:
+            logger.info(f"Mock Kuroro API listening on <cyan>http://{host}:{bound_port}/api</cyan>")
+
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in for the Kuroro ranch API")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.0, 0.0), metavar=('MIN', 'MAX'))
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--onboarded-ratio", type=float, default=1.0)
+    args = parser.parse_args()
+
+    serve(host=args.host, port=args.port, latency=tuple(args.latency), error_rate=args.error_rate,
+          seed=args.seed, onboarded_ratio=args.onboarded_ratio)
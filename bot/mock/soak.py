@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+from time import monotonic
+
+from bot.utils import logger
+from bot.config import settings
+from bot.core.connection import connection_manager
+from bot.core.web_data import web_data_cache
+from bot.core.user_agents import user_agent_store
+from bot.core.checkpoints import checkpoint_store
+from bot.core.retry import retry_policy
+from .bench import SimulatedClient, SimulatedTapper, rss_mb, start_server
+
+
+def open_fds() -> int:
+    for path in ('/proc/self/fd', '/dev/fd'):
+        try:
+            return len(os.listdir(path))
+        except FileNotFoundError:
+            continue
+
+    return -1
+
+
+def sample() -> dict:
+    gc.collect()
+    return {'fds': open_fds(), 'rss_mb': rss_mb()}
+
+
+async def run_soak(server_url: str, sessions: int, rounds: int, warmup: int, churn: float,
+                   concurrency: int) -> dict:
+    settings.API_BASE_URL = f"{server_url}/api"
+    workdir = tempfile.mkdtemp(prefix="kuroro-soak-")
+    web_data_cache.workdir = workdir
+    user_agent_store.file_name = os.path.join(workdir, "user_agents.json")
+    checkpoint_store.file_name = os.path.join(workdir, "checkpoints.sqlite3")
+
+    before = sample()
+    tappers = [SimulatedTapper(tg_client=SimulatedClient(f"soak-{index}", 200_000 + index))
+               for index in range(sessions)]
+    for tapper in tappers:
+        await tapper.start(proxy=None)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    rng = random.Random(0)
+
+    async def run_cycle(tapper: SimulatedTapper) -> None:
+        async with semaphore:
+            await tapper.run_cycle()
+
+    samples = []
+    cycles = 0
+    started = monotonic()
+    try:
+        for _ in range(rounds):
+            await asyncio.gather(*(run_cycle(tapper) for tapper in tappers))
+            cycles += len(tappers)
+
+            # Restart part of the sessions every round, the way bans and crashes do in a long run
+            for index in rng.sample(range(sessions), int(sessions * churn)):
+                await tappers[index].close()
+                tappers[index] = SimulatedTapper(tg_client=tappers[index].tg_client)
+                await tappers[index].start(proxy=None)
+
+            samples.append(sample())
+    finally:
+        await asyncio.gather(*(tapper.close() for tapper in tappers))
+        await connection_manager.close()
+        user_agent_store.flush()
+        checkpoint_store.close()
+
+    after = sample()
+    baseline = samples[min(warmup, len(samples)) - 1] if samples else before
+    return {
+        'sessions': sessions,
+        'cycles': cycles,
+        'wall_s': monotonic() - started,
+        'fds_before': before['fds'],
+        'fds_after_close': after['fds'],
+        'fd_growth': samples[-1]['fds'] - baseline['fds'] if samples else 0,
+        'rss_baseline_mb': baseline['rss_mb'],
+        'rss_growth_mb': samples[-1]['rss_mb'] - baseline['rss_mb'] if samples else 0,
+        'samples': samples,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run many simulated cycles and check that FDs and memory stay flat")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20, help="Every session runs one cycle per round")
+    parser.add_argument("--warmup", type=int, default=3, help="Rounds before the baseline is taken")
+    parser.add_argument("--churn", type=float, default=0.1, help="Share of sessions closed and restarted per round")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.001, 0.005), metavar=('MIN', 'MAX'))
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--max-fd-growth", type=int, default=10)
+    parser.add_argument("--max-rss-growth", type=float, default=32.0, help="MB")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    settings.DELAY_SCALE = 0
+    settings.RATE_LIMIT_PER_PROXY = 0
+    retry_policy.base_delay = retry_policy.max_delay = 0.01
+    logger.remove()
+
+    server, server_url = start_server(latency=tuple(args.latency), error_rate=args.error_rate, seed=1)
+    try:
+        results = asyncio.run(run_soak(server_url=server_url, sessions=args.sessions, rounds=args.rounds,
+                                       warmup=args.warmup, churn=args.churn, concurrency=args.concurrency))
+    finally:
+        server.terminate()
+
+    failures = []
+    if results['fd_growth'] > args.max_fd_growth:
+        failures.append(f"FDs grew by {results['fd_growth']} (limit {args.max_fd_growth})")
+    if results['fds_after_close'] > results['fds_before'] + args.max_fd_growth:
+        failures.append(f"{results['fds_after_close'] - results['fds_before']} FDs still open after shutdown")
+    if results['rss_growth_mb'] > args.max_rss_growth:
+        failures.append(f"RSS grew by {results['rss_growth_mb']:.1f} MB (limit {args.max_rss_growth} MB)")
+    results['failures'] = failures
+
+    print(json.dumps({key: value for key, value in results.items() if key != 'samples'}, indent=4))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=4)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
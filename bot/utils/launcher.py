@@ -1,17 +1,30 @@
 import os
 import glob
+import queue
 import asyncio
 import argparse
-from itertools import cycle
+import signal
+import multiprocessing
+from contextlib import suppress
+from time import time
 import sys
 
 from pyrogram import Client
-from better_proxy import Proxy
 
 from bot.config import settings
 from bot.utils import logger
-from bot.core.tapper import run_tapper
+from bot.utils.metrics import registry, merge_snapshots, run_exporter
+from bot.core.tapper import Tapper
+from bot.core.scheduler import Scheduler
+from bot.core.connection import connection_manager
+from bot.core.user_agents import user_agent_store
 from bot.core.registrator import register_sessions
+from bot.core.onboarding import onboard_all
+from bot.core.cassette import cassette
+from bot.core.proxies import proxy_pool
+from bot.core.telegram import telegram_pool
+from bot.core.checkpoints import checkpoint_store
+from bot.utils.profiler import MODES, LoopProfiler
 
 start_text = """
 
@@ -27,6 +40,7 @@ Select an action:
 
     1. Run clicker
     2. Create session
+    3. Onboard new accounts
 Join our channel here: https://t.me/airdropfactorycn
 """
 
@@ -42,20 +56,15 @@ def get_session_names() -> list[str]:
     return session_names
 
 
-def get_proxies() -> list[Proxy]:
-    if settings.USE_PROXY_FROM_FILE:
-        with open(file="bot/config/proxies.txt", encoding="utf-8-sig") as file:
-            proxies = [Proxy.from_str(proxy=row.strip()).as_url for row in file]
-    else:
-        proxies = []
-
-    return proxies
+def get_proxies() -> list[str]:
+    return proxy_pool.proxies
 
 
-async def get_tg_clients() -> list[Client]:
+async def get_tg_clients(session_names: list[str] | None = None) -> list[Client]:
     global tg_clients
 
-    session_names = get_session_names()
+    if session_names is None:
+        session_names = get_session_names()
 
     if not session_names:
         raise FileNotFoundError("Not found session files")
@@ -80,10 +89,14 @@ async def get_tg_clients() -> list[Client]:
 async def process() -> None:
         parser = argparse.ArgumentParser()
         parser.add_argument("-a", "--action", type=int, help="Action to perform")
+        parser.add_argument("-w", "--workers", type=int, default=1, help="Number of worker processes")
+        parser.add_argument("--profile", choices=MODES,
+                            help="Profile the event loop of every process, results go to PROFILE_DIR")
 
         logger.info(f"Detected {len(get_session_names())} sessions | {len(get_proxies())} proxies")
 
-        action = parser.parse_args().action
+        args = parser.parse_args()
+        action = args.action
 
         if not action:
             logger.info(start_text)
@@ -93,31 +106,245 @@ async def process() -> None:
 
                 if not action.isdigit():
                     logger.warning("Action must be number")
-                elif action not in ["1", "2"]:
-                    logger.warning("Action must be 1 or 2")
+                elif action not in ["1", "2", "3"]:
+                    logger.warning("Action must be 1, 2 or 3")
                 else:
                     action = int(action)
                     break
 
-        if action == 1:
+        if action == 1 and args.workers > 1:
+            await run_workers(workers=args.workers, profile=args.profile)
+
+        elif action == 1:
             tg_clients = await get_tg_clients()
 
-            await run_tasks(tg_clients=tg_clients)
+            await run_tasks(tg_clients=tg_clients, profile=args.profile)
 
         elif action == 2:
             await register_sessions()
 
-async def run_tasks(tg_clients: list[Client]):
-    proxies = get_proxies()
-    proxies_cycle = cycle(proxies) if proxies else None
-    tasks = [
-            asyncio.create_task(
-                run_tapper(
-                    tg_client=tg_client,
-                    proxy=next(proxies_cycle) if proxies_cycle else None,
-                )
-            )
-            for tg_client in tg_clients
-        ]
-
-    await asyncio.gather(*tasks)
+        elif action == 3:
+            tg_clients = await get_tg_clients()
+
+            await run_onboarding(tg_clients=tg_clients)
+
+async def assign_proxies(session_names: list[str]) -> list[tuple[str, str | None]]:
+    await proxy_pool.check_all()
+    bindings = {session_name: checkpoint_store.get(session_name).proxy for session_name in session_names}
+    assignments = proxy_pool.assign(session_names, bindings=bindings)
+
+    moved = 0
+    for session_name, proxy in assignments:
+        if proxy and proxy != bindings[session_name]:
+            moved += bindings[session_name] != ''
+            checkpoint_store.update(session_name, proxy=proxy)
+    if moved:
+        logger.info(f"Proxies | Moved <cyan>{moved}</cyan> session(s) off proxies that are gone or down")
+    # Written before any worker starts, their own rows would otherwise overwrite the new bindings
+    checkpoint_store.flush()
+    return assignments
+
+
+async def run_tasks(tg_clients: list[Client], proxies: list[str | None] | None = None, stats_queue=None,
+                    profile: str | None = None):
+    if proxies is None:
+        proxies = [proxy for _, proxy in (await assign_proxies([tg_client.name for tg_client in tg_clients]))]
+
+    cassette.configure()
+    scheduler = Scheduler()
+    on_shutdown(scheduler.stop)
+    scheduler.add_all([
+        (Tapper(tg_client=tg_client), proxy)
+        for tg_client, proxy in zip(tg_clients, proxies)
+    ])
+
+    if stats_queue is not None:
+        reporter = asyncio.create_task(report_stats(scheduler, stats_queue))
+    else:
+        reporter = asyncio.create_task(run_exporter())
+    helpers = [reporter, asyncio.create_task(proxy_pool.run_reprobe()),
+               asyncio.create_task(telegram_pool.run_reaper())]
+    if profile:
+        helpers.append(asyncio.create_task(LoopProfiler(profile).run()))
+    try:
+        await scheduler.run()
+    finally:
+        for task in helpers:
+            task.cancel()
+        await asyncio.gather(*helpers, return_exceptions=True)
+        user_agent_store.flush()
+        checkpoint_store.close()
+        cassette.save()
+        connection_manager.log_stats()
+        telegram_pool.log_stats()
+        await telegram_pool.close()
+        await connection_manager.close()
+
+
+async def run_onboarding(tg_clients: list[Client]) -> None:
+    proxies = [proxy for _, proxy in (await assign_proxies([tg_client.name for tg_client in tg_clients]))]
+    try:
+        await onboard_all([(Tapper(tg_client=tg_client), proxy) for tg_client, proxy in zip(tg_clients, proxies)])
+    finally:
+        user_agent_store.flush()
+        checkpoint_store.close()
+        await telegram_pool.close()
+        await connection_manager.close()
+
+
+def on_shutdown(callback) -> None:
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        # Windows event loops have no signal handlers, Ctrl+C still ends the run there
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(signum, callback)
+
+
+def collect_stats(scheduler: Scheduler) -> dict:
+    return {**scheduler.stats(), **connection_manager.stats(), **telegram_pool.stats()}
+
+
+async def report_stats(scheduler: Scheduler, stats_queue) -> None:
+    while True:
+        await asyncio.sleep(settings.SCHEDULER_REPORT_INTERVAL)
+        stats_queue.put((os.getpid(), collect_stats(scheduler), registry.snapshot()))
+
+
+def aggregate_stats(snapshots: list[dict]) -> dict:
+    total = {}
+    for snapshot in snapshots:
+        for key, value in snapshot.items():
+            if key.startswith('lateness') or key.endswith('_avg_s'):
+                total[key] = max(total.get(key, 0), value)
+            else:
+                total[key] = total.get(key, 0) + value
+
+    return total
+
+
+def shard_sessions(assignments: list[tuple[str, str | None]], workers: int) -> list[list[tuple[str, str | None]]]:
+    # Rate limit buckets live in each process, so all sessions of one proxy go to the same worker. Largest groups
+    # first onto the emptiest worker, proxy-less sessions fill up whatever is left
+    groups: dict[str, list[tuple[str, str | None]]] = {}
+    direct = []
+    for assignment in assignments:
+        if assignment[1]:
+            groups.setdefault(assignment[1], []).append(assignment)
+        else:
+            direct.append(assignment)
+
+    shards = [[] for _ in range(workers)]
+    for group in sorted(groups.values(), key=len, reverse=True):
+        min(shards, key=len).extend(group)
+    for assignment in direct:
+        min(shards, key=len).append(assignment)
+
+    return [shard for shard in shards if shard]
+
+
+def run_worker(index: int, assignments: list[tuple[str, str | None]], stats_queue,
+               proxy_health: dict[str, dict] | None = None, profile: str | None = None, workers: int = 1) -> None:
+    proxy_pool.restore(proxy_health)
+    # The global and per endpoint limits cover every session, each worker keeps its share of them
+    settings.RATE_LIMIT_GLOBAL /= workers
+    settings.RATE_LIMIT_PER_ENDPOINT /= workers
+    settings.RATE_LIMIT_ENDPOINTS = {endpoint: rate / workers
+                                     for endpoint, rate in settings.RATE_LIMIT_ENDPOINTS.items()}
+
+    async def main():
+        session_names = [session_name for session_name, _ in assignments]
+        tg_clients = await get_tg_clients(session_names=session_names)
+        await run_tasks(tg_clients=tg_clients,
+                        proxies=[proxy for _, proxy in assignments],
+                        stats_queue=stats_queue,
+                        profile=profile)
+
+    if settings.CASSETTE_RECORD:
+        settings.CASSETTE_RECORD = f"{settings.CASSETTE_RECORD}.{index}"
+
+    logger.info(f"Worker {index} | Started with <cyan>{len(assignments)}</cyan> sessions (pid {os.getpid()})")
+    with suppress(KeyboardInterrupt):
+        asyncio.run(main())
+
+
+async def run_workers(workers: int, profile: str | None = None) -> None:
+    session_names = get_session_names()
+    if not session_names:
+        raise FileNotFoundError("Not found session files")
+
+    assignments = await assign_proxies(session_names)
+    shards = shard_sessions(assignments, workers)
+
+    context = multiprocessing.get_context("spawn")
+    stats_queue = context.Queue()
+    processes: dict[int, multiprocessing.Process] = {}
+    snapshots: dict[int, dict] = {}
+    metric_snapshots: dict[int, dict] = {}
+    exporter = asyncio.create_task(run_exporter(lambda: merge_snapshots(list(metric_snapshots.values())).render()))
+
+    def spawn(index: int) -> None:
+        process = context.Process(target=run_worker, daemon=True,
+                                  args=(index, shards[index], stats_queue, proxy_pool.export(), profile, len(shards)))
+        process.start()
+        processes[index] = process
+
+    for index in range(len(shards)):
+        spawn(index)
+
+    stopping = asyncio.Event()
+    on_shutdown(stopping.set)
+
+    # Crashed workers come back at these times, the loop keeps draining stats and watching the others meanwhile
+    restarts: dict[int, float] = {}
+
+    last_report = time()
+    try:
+        while (processes or restarts) and not stopping.is_set():
+            await asyncio.sleep(1)
+
+            while True:
+                try:
+                    pid, stats, metrics = stats_queue.get_nowait()
+                except queue.Empty:
+                    break
+                snapshots[pid] = stats
+                metric_snapshots[pid] = metrics
+
+            for index, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+
+                snapshots.pop(process.pid, None)
+                metric_snapshots.pop(process.pid, None)
+                del processes[index]
+                if process.exitcode == 0:
+                    logger.info(f"Worker {index} | Finished")
+                else:
+                    logger.warning(f"Worker {index} | Crashed with exit code {process.exitcode}, "
+                                   f"restarting in {settings.WORKER_RESTART_DELAY}s")
+                    restarts[index] = time() + settings.WORKER_RESTART_DELAY
+
+            for index, restart_at in list(restarts.items()):
+                if time() >= restart_at:
+                    del restarts[index]
+                    spawn(index)
+
+            if snapshots and time() - last_report >= settings.SCHEDULER_REPORT_INTERVAL:
+                last_report = time()
+                stats = aggregate_stats(list(snapshots.values()))
+                logger.info(f"Supervisor | Workers: <cyan>{len(processes)}</cyan> - "
+                            f"Sessions: <cyan>{stats.get('sessions', 0)}</cyan> - "
+                            f"Running: <cyan>{stats.get('running', 0)}</cyan> - "
+                            f"Cycles: <cyan>{stats.get('cycles', 0)}</cyan> - "
+                            f"Lateness p99: <cyan>{stats.get('lateness_p99', 0):.2f}s</cyan> - "
+                            f"Connections: new <cyan>{stats.get('connections_created', 0)}</cyan> / "
+                            f"reused <cyan>{stats.get('connections_reused', 0)}</cyan>")
+    finally:
+        exporter.cancel()
+        await asyncio.gather(exporter, return_exceptions=True)
+        # SIGTERM lets every worker drain its running cycles before it exits
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in processes.values():
+            await asyncio.to_thread(process.join, settings.SHUTDOWN_TIMEOUT + 5)
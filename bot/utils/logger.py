@@ -1,33 +1,117 @@
+import atexit
+import queue
 import sys
+import threading
+
 from loguru import logger
 
+from bot.config import settings
+
+
+COLOR_FORMAT = ("<white>{time:YYYY-MM-DD HH:mm:ss}</white>"
+                " | <level>{level}</level>"
+                " | <white><b>{message}</b></white>")
+PLAIN_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}"
+
+
+class BatchedSink:
+    def __init__(self, stream, interval: float):
+        self.stream = stream
+        self.interval = interval
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message: str) -> None:
+        self._queue.put(message)
+
+    def _run(self) -> None:
+        while True:
+            message = self._queue.get()
+            if message is None:
+                return
+
+            # Collect whatever else arrived in the meantime and write it in one go
+            batch = [message]
+            stopping = False
+            try:
+                while True:
+                    message = self._queue.get(timeout=self.interval) if len(batch) == 1 else self._queue.get_nowait()
+                    if message is None:
+                        stopping = True
+                        break
+                    batch.append(message)
+            except queue.Empty:
+                pass
+
+            self.stream.write(''.join(batch))
+            self.stream.flush()
+            if stopping:
+                return
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+LOG_LEVEL = settings.LOG_LEVEL.upper()
+
+
+def open_sink(stream, plain: bool) -> None:
+    colorize = not plain and stream.isatty() if hasattr(stream, 'isatty') else False
+    if colorize and sys.platform == 'win32':
+        # Loguru only converts colors for the Windows console when it writes to the stream itself
+        from colorama import AnsiToWin32
+        stream = AnsiToWin32(stream).stream
+
+    sink = BatchedSink(stream, interval=settings.LOG_BATCH_INTERVAL)
+    atexit.register(sink.stop)
+    logger.add(sink=sink.write, level=LOG_LEVEL, colorize=colorize,
+               format=PLAIN_FORMAT if plain else COLOR_FORMAT)
+
 
 logger.remove()
-logger.add(sink=sys.stdout, format="<white>{time:YYYY-MM-DD HH:mm:ss}</white>"
-                                   " | <level>{level}</level>"
-                                   " | <white><b>{message}</b></white>")
+open_sink(sys.stdout, plain=settings.LOG_PLAIN)
+if settings.LOG_FILE:
+    open_sink(open(settings.LOG_FILE, 'a', encoding='utf-8'), plain=True)
 logger = logger.opt(colors=True)
 
+_min_level = logger.level(LOG_LEVEL).no
+_level_numbers = {}
+
+
+def enabled(level: str) -> bool:
+    number = _level_numbers.get(level)
+    if number is None:
+        number = _level_numbers[level] = logger.level(level).no
+
+    return number >= _min_level
+
+
+def log(level: str, text) -> None:
+    if enabled(level):
+        logger.log(level, text)
+
 
 def info(text):
-    return logger.info(text)
+    return log("INFO", text)
 
 
 def debug(text):
-    return logger.debug(text)
+    return log("DEBUG", text)
 
 
 def warning(text):
-    return logger.warning(text)
+    return log("WARNING", text)
 
 
 def error(text):
-    return logger.error(text)
+    return log("ERROR", text)
 
 
 def critical(text):
-    return logger.critical(text)
+    return log("CRITICAL", text)
 
 
 def success(text):
-    return logger.success(text)
\ No newline at end of file
+    return log("SUCCESS", text)
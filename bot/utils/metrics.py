@@ -0,0 +1,198 @@
+import asyncio
+import os
+from bisect import bisect_left
+from typing import Callable
+
+from aiohttp import web
+
+from bot.config import settings
+from .logger import logger
+
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def snapshot(self) -> dict:
+        return {'values': dict(self.values)}
+
+    def merge(self, snapshot: dict) -> None:
+        for labels, value in snapshot['values'].items():
+            self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in self.values.items()]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    # How the supervisor combines the workers' values: counts add up, states and latencies don't
+    AGGREGATES = {'sum': lambda a, b: a + b, 'max': max, 'min': min}
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), aggregate: str = 'sum'):
+        super().__init__(name, documentation, labelnames)
+        self.aggregate = aggregate
+        self._combine = self.AGGREGATES[aggregate]
+
+    def merge(self, snapshot: dict) -> None:
+        for labels, value in snapshot['values'].items():
+            current = self.values.get(labels)
+            self.values[labels] = value if current is None else self._combine(current, value)
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, *labels, value: float) -> None:
+        self.values[labels] = value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # Per label set: one counter per bucket plus +Inf, then the sum of observations
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def snapshot(self) -> dict:
+        return {'values': {labels: list(series) for labels, series in self.values.items()}}
+
+    def merge(self, snapshot: dict) -> None:
+        for labels, series in snapshot['values'].items():
+            current = self.values.get(labels)
+            if current is None:
+                self.values[labels] = list(series)
+            else:
+                self.values[labels] = [a + b for a, b in zip(current, series)]
+
+    def render(self) -> list[str]:
+        lines = []
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                bucket_labels = _labels(self.labelnames, labels, 'le="' + str(bound) + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Counter | Gauge | Histogram] = {}
+
+    def _register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = (), aggregate: str = 'sum') -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, aggregate))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def merge_snapshots(snapshots: list[dict]) -> Registry:
+    merged = Registry()
+    for name, metric in registry.metrics.items():
+        if isinstance(metric, Histogram):
+            merged.histogram(name, metric.documentation, metric.labelnames, metric.buckets)
+        elif isinstance(metric, Gauge):
+            merged.gauge(name, metric.documentation, metric.labelnames, metric.aggregate)
+        else:
+            merged._register(type(metric)(name, metric.documentation, metric.labelnames))
+
+    for snapshot in snapshots:
+        for name, values in snapshot.items():
+            if name in merged.metrics:
+                merged.metrics[name].merge(values)
+
+    return merged
+
+
+def write_metrics(path: str, text: str) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+async def run_exporter(render: Callable[[], str] = registry.render) -> None:
+    runner = None
+    if settings.METRICS_PORT:
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(text=render(), content_type='text/plain', charset='utf-8')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, settings.METRICS_HOST, settings.METRICS_PORT).start()
+        logger.info(f"Metrics available at <cyan>http://{settings.METRICS_HOST}:{settings.METRICS_PORT}/metrics</cyan>")
+
+    try:
+        while settings.METRICS_FILE:
+            await asyncio.sleep(settings.METRICS_INTERVAL)
+            write_metrics(settings.METRICS_FILE, render())
+        if runner is not None:
+            await asyncio.Event().wait()
+    finally:
+        if settings.METRICS_FILE:
+            write_metrics(settings.METRICS_FILE, render())
+        if runner is not None:
+            await runner.cleanup()
@@ -0,0 +1,216 @@
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter, deque
+from time import monotonic, perf_counter, time
+
+from bot.config import settings
+from bot.utils import logger
+from bot.utils.metrics import registry
+from bot.core.scheduler import percentile
+
+
+MODES = ('cprofile', 'sampling', 'loop')
+LAG_INTERVAL = 0.1
+ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+LOOP_LAG = registry.histogram('kuroro_loop_lag_seconds', 'How late the event loop woke up a sleeping timer',
+                              buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+SLOW_CALLBACKS = registry.counter('kuroro_slow_callbacks_total',
+                                  'Event loop callbacks that ran longer than PROFILE_SLOW_CALLBACK', ('callback',))
+
+
+def describe(handle: asyncio.Handle) -> str:
+    callback = handle._callback
+    task = getattr(callback, '__self__', None)
+    if not isinstance(task, asyncio.Task):
+        return getattr(callback, '__qualname__', repr(callback))
+
+    # Name the task by its coroutine and the await it is parked on now, which is where the slow step ended
+    coro = task.get_coro()
+    name = getattr(coro, '__qualname__', repr(coro))
+    location = None
+    while coro is not None and getattr(coro, 'cr_frame', None) is not None:
+        if not coro.cr_frame.f_code.co_filename.startswith(ASYNCIO_DIR):
+            location = coro.cr_frame
+        coro = coro.cr_await
+    if location is not None:
+        name += f" @ {os.path.basename(location.f_code.co_filename)}:{location.f_lineno}"
+    return name
+
+
+class StackSampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def dump(self, path: str) -> None:
+        # Folded stacks, the input format of flamegraph.pl, speedscope and inferno
+        with open(path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+class LoopProfiler:
+    def __init__(self, mode: str, directory: str | None = None):
+        self.mode = mode
+        self.directory = directory or settings.PROFILE_DIR
+        self.pid = os.getpid()
+
+        self.lag = deque(maxlen=10_000)
+        self.slow = Counter()
+        self.slow_time = Counter()
+        self._slow_log = None
+        self._original_run = None
+        self._last_snapshot = 0.0
+        self._snapshots = 0
+
+    def _path(self, name: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{name}-{self.pid}.{suffix}")
+
+    def _install_hook(self) -> None:
+        threshold = settings.PROFILE_SLOW_CALLBACK
+        original_run = self._original_run = asyncio.events.Handle._run
+        profiler = self
+
+        def _run(handle):
+            started = perf_counter()
+            original_run(handle)
+            elapsed = perf_counter() - started
+            if elapsed >= threshold:
+                profiler.record_slow(handle, elapsed)
+
+        asyncio.events.Handle._run = _run
+
+    def _remove_hook(self) -> None:
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run
+            self._original_run = None
+
+    def record_slow(self, handle: asyncio.Handle, elapsed: float) -> None:
+        name = describe(handle)
+        self.slow[name] += 1
+        self.slow_time[name] += elapsed
+        SLOW_CALLBACKS.inc(name.split(' @ ')[0])
+        self._slow_log.write(json.dumps({'time': time(), 'callback': name, 'seconds': round(elapsed, 4)}) + '\n')
+
+        if tracemalloc.is_tracing() and monotonic() - self._last_snapshot >= 60:
+            self._last_snapshot = monotonic()
+            self.snapshot()
+
+    def snapshot(self) -> None:
+        self._snapshots += 1
+        tracemalloc.take_snapshot().dump(self._path(f"tracemalloc-{self._snapshots}", 'snapshot'))
+
+    async def _measure_lag(self) -> None:
+        while True:
+            expected = monotonic() + LAG_INTERVAL
+            await asyncio.sleep(LAG_INTERVAL)
+            lag = max(0.0, monotonic() - expected)
+            self.lag.append(lag)
+            LOOP_LAG.observe(lag)
+
+    def report(self) -> dict:
+        lag = list(self.lag)
+        return {
+            'time': time(),
+            'lag_p50': percentile(lag, 0.5),
+            'lag_p90': percentile(lag, 0.9),
+            'lag_p99': percentile(lag, 0.99),
+            'lag_max': max(lag, default=0.0),
+            'slow_callbacks': sum(self.slow.values()),
+            'slowest': [{'callback': name, 'count': self.slow[name], 'seconds': round(seconds, 3)}
+                        for name, seconds in self.slow_time.most_common(5)],
+        }
+
+    async def _report(self) -> None:
+        with open(self._path("loop_lag", 'jsonl'), 'a') as output:
+            while True:
+                await asyncio.sleep(settings.SCHEDULER_REPORT_INTERVAL)
+                report = self.report()
+                output.write(json.dumps(report) + '\n')
+                output.flush()
+                self._slow_log.flush()
+                logger.info(f"Profiler | Loop lag p50/p99/max: <cyan>{report['lag_p50'] * 1000:.1f}ms</cyan>/"
+                            f"<cyan>{report['lag_p99'] * 1000:.1f}ms</cyan>/"
+                            f"<cyan>{report['lag_max'] * 1000:.1f}ms</cyan> - "
+                            f"Slow callbacks: <cyan>{report['slow_callbacks']}</cyan>")
+                self.lag.clear()
+
+    async def _profile_window(self) -> None:
+        if self.mode == 'cprofile':
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await asyncio.sleep(settings.PROFILE_WINDOW)
+            finally:
+                profile.disable()
+                path = self._path("cprofile", 'prof')
+                profile.dump_stats(path)
+                with open(self._path("cprofile", 'txt'), 'w') as output:
+                    pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(50)
+                logger.info(f"Profiler | cProfile results written to <cyan>{path}</cyan>")
+
+        elif self.mode == 'sampling':
+            sampler = StackSampler(settings.PROFILE_SAMPLE_INTERVAL)
+            sampler.start()
+            try:
+                await asyncio.sleep(settings.PROFILE_WINDOW)
+            finally:
+                sampler.stop()
+                path = self._path("samples", 'folded')
+                sampler.dump(path)
+                logger.info(f"Profiler | <cyan>{sampler.samples}</cyan> stack samples written to <cyan>{path}</cyan>")
+
+    async def run(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        if settings.PROFILE_TRACEMALLOC:
+            tracemalloc.start(settings.PROFILE_TRACEMALLOC)
+
+        self._slow_log = open(self._path("slow_callbacks", 'jsonl'), 'a')
+        self._install_hook()
+        logger.info(f"Profiler | Mode <cyan>{self.mode}</cyan>, writing to <cyan>{self.directory}</cyan>")
+
+        tasks = [asyncio.create_task(self._measure_lag()), asyncio.create_task(self._report())]
+        try:
+            await self._profile_window()
+            # The lag monitor keeps going after the profiling window, until the bot stops
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._remove_hook()
+            with open(self._path("loop_lag", 'jsonl'), 'a') as output:
+                output.write(json.dumps(self.report()) + '\n')
+            self._slow_log.close()
+            if tracemalloc.is_tracing():
+                self.snapshot()
+                tracemalloc.stop()